@@ -1,9 +1,9 @@
-import copy
 import traceback
 import tcod
-from src.engine.engine import Engine
-from src.entities import entityFactories
-from src.map.procgen import generateDungeon
+from src.engine.inputQueue import coalesceEvents
+from src.engine.profiler import profiler
+from src.engine.replay import Recorder
+from src.engine.setup import newEngine
 from src.display import colours
 
 # Screen Constants
@@ -24,6 +24,26 @@ MAX_ROOMS = 30
 MAX_MONSTERS_PER_ROOM = 2
 MAX_ITEMS_PER_ROOM = 2
 
+# Frames are only drawn after something changes, and at most this often.
+MAX_FPS = 60
+
+# Auto-repeated presses of a held key handled per frame drawn, None for no limit.
+KEY_REPEATS_PER_FRAME = 1
+
+# Dungeon levels generated ahead of time, and the processes generating them.
+# None until the game has a way down to the next level to use them.
+PREGEN_DEPTH = 0
+PREGEN_WORKERS = 1
+
+# Record the session to this file, to replay with simulate.py --replay. None to not record.
+RECORD_PATH = None
+
+# Append messages pushed out of the message log to this file. None to drop them.
+MESSAGE_SPILL_PATH = None
+
+# Time the phases of each turn and frame, and draw the timings over the map.
+PROFILE = False
+
 
 def main() -> None:
     tileset = tcod.tileset.load_tilesheet(
@@ -33,48 +53,68 @@ def main() -> None:
         tcod.tileset.CHARMAP_TCOD
     )
 
-    player = copy.deepcopy(entityFactories.player)
-    engine = Engine(player=player)
-
-    engine.gameMap = generateDungeon(
+    options = dict(
+        mapWidth=MAP_WIDTH,
+        mapHeight=MAP_HEIGHT,
         maxRooms=MAX_ROOMS,
         minRoomSize=MIN_ROOM_SIZE,
         maxRoomSize=MAX_ROOM_SIZE,
-        mapWidth=MAP_WIDTH,
-        mapHeight=MAP_HEIGHT,
         maxMonstersPerRoom=MAX_MONSTERS_PER_ROOM,
         maxItemsPerRoom=MAX_ITEMS_PER_ROOM,
-        engine=engine,
     )
+    engine = newEngine(**options, pregenDepth=PREGEN_DEPTH, pregenWorkers=PREGEN_WORKERS)
+    engine.messageLog.spillPath = MESSAGE_SPILL_PATH
+    recorder = Recorder(RECORD_PATH, engine, options) if RECORD_PATH else None
 
-    engine.updateFOV()
+    if PROFILE:
+        profiler.enable(overlay=True)
 
-    engine.messageLog.addMessage(
-        "Welcome to the dungeon! We've got fun and games!", colours.welcomeText
-    )
+    try:
+        with tcod.context.new_terminal(
+                WIDTH,
+                HEIGHT,
+                tileset=tileset,
+                title="Yet Another Roguelike Tutorial",
+                vsync=True,
+        ) as context:
+            rootConsole = tcod.Console(WIDTH, HEIGHT, order="F")
+            frames = engine.frameScheduler
+            frames.maxFPS = MAX_FPS
+            frames.keyRepeatsPerFrame = KEY_REPEATS_PER_FRAME
+            while True:
+                if frames.beginFrame():
+                    rootConsole.clear()
+                    engine.eventHandler.onRender(console=rootConsole)
+                    with profiler.phase("present"):
+                        context.present(rootConsole)
+                    frames.endFrame()
+
+                # noinspection PyBroadException
+                try:
+                    # Wait for input, but no longer than until the next frame is due.
+                    events = coalesceEvents(
+                        tcod.event.wait(timeout=frames.timeout()),
+                        allowKeyRepeat=frames.allowKeyRepeat,
+                    )
+                    for event in events:
+                        context.convert_event(event)
+                        if recorder is not None:
+                            recorder.record(event)
+                        engine.eventHandler.handleEvents(event)
+                        if recorder is not None:
+                            recorder.checkpoint()
+                except Exception as exc:  # Handle exceptions in game.
+                    traceback.print_exc()  # Print error to stderr.
+                    # Then print the error to the message log.
+                    engine.messageLog.addMessage(traceback.format_exc(), colours.error)
+                    if recorder is not None:
+                        recorder.recordError(exc)
 
-    with tcod.context.new_terminal(
-            WIDTH,
-            HEIGHT,
-            tileset=tileset,
-            title="Yet Another Roguelike Tutorial",
-            vsync=True,
-    ) as context:
-        rootConsole = tcod.Console(WIDTH, HEIGHT, order="F")
-        while True:
-            rootConsole.clear()
-            engine.eventHandler.onRender(console=rootConsole)
-            context.present(rootConsole)
-
-            # noinspection PyBroadException
-            try:
-                for event in tcod.event.wait():
-                    context.convert_event(event)
-                    engine.eventHandler.handleEvents(event)
-            except Exception:  # Handle exceptions in game.
-                traceback.print_exc()  # Print error to stderr.
-                # Then print the error to the message log.
-                engine.messageLog.addMessage(traceback.format_exc(), colours.error)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        engine.messageLog.close()
+        engine.levels.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""
+Measure the memory used per instance of the game's most numerous classes.
+
+Each class is compared against a subclass of it which adds back a per-instance
+__dict__, which is how these classes were laid out before they used __slots__.
+"""
+import argparse
+import gc
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from src.components.ai import HostileEnemy
+from src.components.consumeable import HealingConsumeable
+from src.components.fighter import Fighter
+from src.components.inventory import Inventory
+from src.display.messageLog import Message
+from src.engine.actions import MovementAction
+from src.entities.entity import Actor, Item
+
+
+def withDict(cls: type) -> type:
+    """Return a subclass of 'cls' whose instances have a __dict__."""
+    return type(cls.__name__, (cls,), {})
+
+
+def bytesPerInstance(create: Callable[[], object], count: int) -> float:
+    """Return the average number of bytes allocated by 'create'."""
+    # Fill the component store with free rows first, so that its growth isn't counted.
+    warmUp = [create() for _ in range(count)]
+    del warmUp
+    gc.collect()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [create() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    listSize = instances.__sizeof__()
+    return (after - before - listSize) / count
+
+
+def cases(actor: Actor) -> List[Tuple[str, type, Callable[[type], object]]]:
+    return [
+        ("Message", Message, lambda cls: cls("The Orc attacks Player for 1 hit points.", (255, 255, 255))),
+        ("MovementAction", MovementAction, lambda cls: cls(actor, 1, 0)),
+        ("Fighter", Fighter, lambda cls: cls(hp=10, defence=0, power=3)),
+        ("Inventory", Inventory, lambda cls: cls(capacity=0)),
+        ("HealingConsumeable", HealingConsumeable, lambda cls: cls(amount=4)),
+        (
+            "Item", Item,
+            lambda cls: cls(char="!", colour=(127, 0, 255), name="Health Potion", consumeable=HealingConsumeable(4)),
+        ),
+        (
+            "Actor", Actor,
+            lambda cls: cls(
+                char="o",
+                colour=(63, 127, 63),
+                name="Orc",
+                aiCLS=HostileEnemy,
+                fighter=Fighter(hp=10, defence=0, power=3),
+                inventory=Inventory(capacity=0),
+            ),
+        ),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20_000, help="Number of instances to create of each class.")
+    args = parser.parse_args()
+
+    # The actor performing the benchmarked actions.
+    actor = Actor(
+        char="@",
+        name="Player",
+        aiCLS=HostileEnemy,
+        fighter=Fighter(hp=30, defence=2, power=5),
+        inventory=Inventory(capacity=26),
+    )
+
+    print(f"{'Class':<20}{'__dict__':>12}{'__slots__':>12}{'Saved':>8}")
+    for name, cls, create in cases(actor):
+        dictLayout = withDict(cls)
+        before = bytesPerInstance(lambda: create(dictLayout), args.count)
+        after = bytesPerInstance(lambda: create(cls), args.count)
+        print(f"{name:<20}{before:>10.0f} B{after:>10.0f} B{1 - after / before:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
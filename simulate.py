@@ -0,0 +1,163 @@
+"""Run the game headless, driven by a scripted or random player, and report its speed."""
+import argparse
+
+import tcod
+
+from main import (
+    WIDTH,
+    HEIGHT,
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    MAX_ROOM_SIZE,
+    MIN_ROOM_SIZE,
+    MAX_ROOMS,
+    MAX_MONSTERS_PER_ROOM,
+    MAX_ITEMS_PER_ROOM,
+)
+from src.engine.profiler import profiler
+from src.engine.replay import Recorder, replay
+from src.engine.saveGame import loadGame, saveGame
+from src.engine.setup import newChunkedEngine, newEngine
+from src.engine.simulation import RandomPolicy, ScriptedPolicy, SimulationReport, runSimulation
+from src.map.activity import ACTIVE_RADIUS
+
+
+def parseArgs() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=1000, help="Number of key presses to simulate.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for map generation and the random player.")
+    parser.add_argument("--script", default=None, help="Keys to press in a loop, e.g. 'hhjjl.g'. Random if omitted.")
+    parser.add_argument("--render", action="store_true", help="Also render every step to an offscreen console.")
+    parser.add_argument("--map-width", type=int, default=MAP_WIDTH)
+    parser.add_argument("--map-height", type=int, default=MAP_HEIGHT)
+    parser.add_argument("--max-rooms", type=int, default=MAX_ROOMS)
+    parser.add_argument("--max-monsters-per-room", type=int, default=MAX_MONSTERS_PER_ROOM)
+    parser.add_argument("--max-items-per-room", type=int, default=MAX_ITEMS_PER_ROOM)
+    parser.add_argument(
+        "--storage-dir", default=None,
+        help="Directory to keep memory mapped tile layers in. Ignored for chunked worlds.",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=None,
+        help="Use a chunked world generated in chunks of this size. --max-rooms is then per chunk.",
+    )
+    parser.add_argument(
+        "--descend-every", type=int, default=None, help="Descend to a new level after this many turns on each.",
+    )
+    parser.add_argument("--pregen-depth", type=int, default=0, help="Levels to generate ahead of time.")
+    parser.add_argument("--pregen-workers", type=int, default=1, help="Processes generating levels ahead of time.")
+    parser.add_argument("--load", default=None, help="Start from this save file instead of a new map.")
+    parser.add_argument("--save", default=None, help="Save the final state to this file.")
+    parser.add_argument("--record", default=None, help="Record the key presses to this file, to be replayed.")
+    parser.add_argument(
+        "--message-spill", default=None, help="Append messages pushed out of the message log to this file.",
+    )
+    parser.add_argument(
+        "--replay", default=None,
+        help="Replay a recording, checking it plays out the same, instead of a new simulation. "
+             "Only --render, --pregen-* and the profiling options apply.",
+    )
+    parser.add_argument(
+        "--active-radius", type=int, default=ACTIVE_RADIUS,
+        help="Actors further than this from the player, and out of sight, go dormant.",
+    )
+    parser.add_argument("--keep-awake", action="store_true", help="Simulate every actor every turn.")
+    parser.add_argument("--profile", action="store_true", help="Print the time spent in each phase of a turn.")
+    parser.add_argument("--trace", default=None, help="Write a Chrome trace of each phase to this file.")
+    parser.add_argument("--profile-csv", default=None, help="Write the phase timings and counters to this CSV file.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parseArgs()
+    if args.record and (args.load or args.chunk_size or args.descend_every):
+        raise SystemExit("--record can't be used with --load, --chunk-size or --descend-every.")
+    if args.descend_every and args.chunk_size:
+        raise SystemExit("--descend-every can't be used with --chunk-size, a chunked world has a single level.")
+
+    console = tcod.Console(WIDTH, HEIGHT, order="F") if args.render else None
+    if args.profile or args.trace or args.profile_csv:
+        profiler.enable()
+
+    if args.replay:
+        report = replay(
+            args.replay, console=console, pregenDepth=args.pregen_depth, pregenWorkers=args.pregen_workers,
+        )
+        report.engine.levels.close()
+        printReport(report, args)
+        return
+
+    options = dict(
+        mapWidth=args.map_width,
+        mapHeight=args.map_height,
+        maxRooms=args.max_rooms,
+        minRoomSize=MIN_ROOM_SIZE,
+        maxRoomSize=MAX_ROOM_SIZE,
+        maxMonstersPerRoom=args.max_monsters_per_room,
+        maxItemsPerRoom=args.max_items_per_room,
+        seed=args.seed,
+    )
+
+    if args.load:
+        engine = loadGame(args.load, pregenDepth=args.pregen_depth, pregenWorkers=args.pregen_workers)
+    elif args.chunk_size:
+        engine = newChunkedEngine(
+            seed=args.seed or 0,
+            chunkSize=args.chunk_size,
+            mapWidth=args.map_width,
+            mapHeight=args.map_height,
+            viewWidth=MAP_WIDTH,
+            viewHeight=MAP_HEIGHT,
+            maxRoomsPerChunk=args.max_rooms,
+            minRoomSize=MIN_ROOM_SIZE,
+            maxRoomSize=MAX_ROOM_SIZE,
+            maxMonstersPerRoom=args.max_monsters_per_room,
+            maxItemsPerRoom=args.max_items_per_room,
+        )
+    else:
+        engine = newEngine(
+            **options,
+            storageDir=args.storage_dir,
+            pregenDepth=args.pregen_depth,
+            pregenWorkers=args.pregen_workers,
+        )
+
+    engine.gameMap.activity.radius = None if args.keep_awake else args.active_radius
+    engine.messageLog.spillPath = args.message_spill
+
+    if args.script:
+        try:
+            policy = ScriptedPolicy.fromString(args.script)
+        except ValueError as exc:
+            raise SystemExit(f"--script: {exc}")
+    else:
+        policy = RandomPolicy(args.seed)
+
+    recorder = Recorder(args.record, engine, options) if args.record else None
+    report = runSimulation(
+        engine, policy, steps=args.steps, console=console, descendEvery=args.descend_every, recorder=recorder,
+    )
+    if recorder is not None:
+        recorder.close()
+    engine.messageLog.close()
+    if engine.levels is not None:
+        engine.levels.close()
+    printReport(report, args)
+
+    if args.save:
+        saveGame(engine, args.save)
+
+
+def printReport(report: SimulationReport, args: argparse.Namespace) -> None:
+    print(report.summary())
+
+    if args.profile:
+        print("\n".join(profiler.summary()))
+    if args.trace:
+        profiler.writeChromeTrace(args.trace)
+    if args.profile_csv:
+        profiler.writeCSV(args.profile_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,75 @@
 from __future__ import annotations
 
-from typing import Tuple, List, TYPE_CHECKING
+from typing import Tuple, List, Optional, TYPE_CHECKING
 
-import numpy as np  # type: ignore
-import tcod
-
-from src.engine.actions import Action, MeleeAction, MovementAction, WaitAction
+from src.engine.actions import Action, MeleeAction, MovementAction
+from src.engine.profiler import profiler
 
 if TYPE_CHECKING:
-    from src.entities.entity import Actor
+    from src.entities.entity import Actor, Entity
+
+# Turns a monster waits for a blocked step on its path to clear before looking for another way,
+# unless what's in the way is a monster following a path of its own.
+MAX_BLOCKED_TURNS = 3
 
 
 class BaseAI(Action):
+    __slots__ = ()
 
     def perform(self) -> None:
+        """
+        Take this actor's turn. AIs test the actions they consider with
+        Action.check or Action.tryPerform, so this never raises Impossible.
+        """
         raise NotImplementedError()
 
+    def catchUp(self, turns: int) -> None:
+        """Called when this actor wakes up after lying dormant for 'turns' turns. Does nothing by default."""
+
     def getPathTo(self, destX: int, destY: int) -> List[Tuple[int, int]]:
         """
         Compute and return a path to the target position.
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gameMap.tiles["walkable"], dtype=np.int8)
+        if profiler.enabled:
+            profiler.count(f"{type(self).__name__}.paths")
 
-        for entity in self.entity.gameMap.entities:
-            #  Check that an entity blocks movement and the cost isn't zero (blocking.)
-            if entity.blocksMovement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means tmore enemies will crowd behind each other
-                # in hallways. A higher number means enemies will take longer paths
-                # in order ot surorund the player.
-                cost[entity.x, entity.y] += 10
+        # Reuse the map's pathfinder, which is kept up to date with the map.
+        grid = self.entity.gameMap.costGrid
+        if not grid.contains(self.entity.x, self.entity.y) or not grid.contains(destX, destY):
+            return []
+        pathfinder = grid.pathfinder()
 
-        # Create a graph from the cost array and pass that graph to the new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
-
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        # Start position.
+        pathfinder.add_root((self.entity.x - grid.x, self.entity.y - grid.y))
 
         # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((destX, destY))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to((destX - grid.x, destY - grid.y))[1:].tolist()
 
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        # Convert from List[List[int]] to List[Tuple[int, int]] in map coordinates.
+        return [(index[0] + grid.x, index[1] + grid.y) for index in path]
 
 
 class HostileEnemy(BaseAI):
+    __slots__ = ("path", "lastSeen", "blockedTurns")
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
+        self.lastSeen: Optional[Tuple[int, int]] = None
+        # Turns in a row the next step on the path has been blocked by something not about to move.
+        self.blockedTurns = 0
+
+    def catchUp(self, turns: int) -> None:
+        """Skip along the path for the turns spent dormant, rather than walking it a step at a time."""
+        steps = min(turns, len(self.path))
+        # Stop at the furthest free tile, in case something has moved onto the path meanwhile.
+        for i in range(steps - 1, -1, -1):
+            x, y = self.path[i]
+            if not self.entity.gameMap.getBlockingEntityAtLocation(x, y):
+                self.entity.relocate(x, y)
+                del self.path[: i + 1]
+                return
 
     def perform(self) -> None:
         target = self.engine.player
@@ -57,16 +77,52 @@ class HostileEnemy(BaseAI):
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance.
 
-        if self.engine.gameMap.visible[self.entity.x, self.entity.y]:
+        if self.engine.gameMap.perception.canSeePlayer(self.entity):
             if distance <= 1:
-                return MeleeAction(self.entity, dx, dy).perform()
-
-            self.path = self.getPathTo(target.x, target.y)
+                # Fails only if the player has already been killed this turn.
+                MeleeAction(self.entity, dx, dy).tryPerform()
+                return
+
+            # Chase the player down the shared flow field while they are in sight.
+            self.path = []
+            self.lastSeen = target.x, target.y
+            # The flow field only steps onto free tiles, so the move is always possible.
+            step = self.engine.playerFlowField.descend(self.entity.x, self.entity.y)
+            if step:
+                MovementAction(self.entity, step[0] - self.entity.x, step[1] - self.entity.y).apply()
+            return
+
+        if self.lastSeen:
+            # Out of sight, head for where the player was last seen.
+            self.path = self.getPathTo(*self.lastSeen)
+            self.lastSeen = None
+            self.blockedTurns = 0
 
         if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
-            ).perform()
-
-        return WaitAction(self.entity).perform()
+            destX, destY = self.path[0]
+            # Keep to the path and wait if something is in the way, rather than losing a step.
+            if MovementAction(self.entity, destX - self.entity.x, destY - self.entity.y).tryPerform():
+                del self.path[0]
+                self.blockedTurns = 0
+                return
+            if profiler.enabled:
+                profiler.count(f"{type(self).__name__}.blocked")
+            if self._willMove(self.engine.gameMap.getBlockingEntityAtLocation(destX, destY)):
+                return  # Queued behind it.
+            self.blockedTurns += 1
+            if self.blockedTurns >= MAX_BLOCKED_TURNS:
+                # The cost grid counts against blocking entities, so a new path goes around the
+                # blocker if it can. If it still goes through, give up rather than wait forever.
+                path = self.getPathTo(*self.path[-1])
+                self.path = path if path and path[0] != (destX, destY) else []
+                self.blockedTurns = 0
+
+    def _willMove(self, blocker: Optional[Entity]) -> bool:
+        """Return whether 'blocker' is an awake monster following a path that doesn't lead into this one."""
+        ai = getattr(blocker, "ai", None)
+        return (
+            isinstance(ai, HostileEnemy)
+            and bool(ai.path)
+            and ai.path[0] != (self.entity.x, self.entity.y)
+            and not self.engine.gameMap.activity.isDormant(blocker)
+        )
@@ -9,6 +9,8 @@ if TYPE_CHECKING:
 
 
 class BaseComponent:
+    __slots__ = ("parent",)
+
     parent: Entity  # Owning entity instance.
 
     @property
@@ -13,6 +13,8 @@ if TYPE_CHECKING:
 
 
 class Consumeable(BaseComponent):
+    __slots__ = ()
+
     parent: Item
 
     def getAction(self, consumer: Actor) -> Optional[actions.Action]:
@@ -35,6 +37,8 @@ class Consumeable(BaseComponent):
 
 
 class HealingConsumeable(Consumeable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
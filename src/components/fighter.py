@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 from src.components.baseComponent import BaseComponent
+from src.entities.componentStore import store
 from src.engine.inputHandlers import GameOverEventHandler
 from src.map.renderOrder import RenderOrder
 from src.display import colours
@@ -10,22 +11,65 @@ if TYPE_CHECKING:
 
 
 class Fighter(BaseComponent):
+    """
+    Combat stats for an Actor.
+
+    Until it's attached the stats are held here, afterwards they live in
+    the parent's row of the component store.
+    """
+
+    __slots__ = ("_initialStats",)
+
     parent: Actor
 
     def __init__(self, hp: int, defence: int, power: int):
-        self.maxHP = hp
-        self._hp = hp
-        self.defence = defence
-        self.power = power
+        self._initialStats = hp, defence, power
+
+    def attach(self, parent: Actor) -> None:
+        """Make 'parent' the owner of this fighter, moving the stats into its row."""
+        self.parent = parent
+        hp, defence, power = self._initialStats
+        del self._initialStats
+
+        row = parent._row
+        store.maxHP[row] = hp
+        store.hp[row] = hp
+        store.defence[row] = defence
+        store.power[row] = power
+
+    @property
+    def maxHP(self) -> int:
+        return store.maxHP.item(self.parent._row)
+
+    @maxHP.setter
+    def maxHP(self, value: int) -> None:
+        store.maxHP[self.parent._row] = value
+
+    @property
+    def defence(self) -> int:
+        return store.defence.item(self.parent._row)
+
+    @defence.setter
+    def defence(self, value: int) -> None:
+        store.defence[self.parent._row] = value
+
+    @property
+    def power(self) -> int:
+        return store.power.item(self.parent._row)
+
+    @power.setter
+    def power(self, value: int) -> None:
+        store.power[self.parent._row] = value
 
     @property
     def hp(self) -> int:
-        return self._hp
+        return store.hp.item(self.parent._row)
 
     @hp.setter
     def hp(self, value: int) -> int:
-        self._hp = max(0, min(value, self.maxHP))
-        if self._hp == 0 and self.parent.ai:
+        hp = max(0, min(value, self.maxHP))
+        store.hp[self.parent._row] = hp
+        if hp == 0 and self.parent.ai:
             self.die()
 
     def die(self) -> None:
@@ -39,10 +83,11 @@ class Fighter(BaseComponent):
 
         self.parent.char = "%"
         self.parent.colour = (191, 0, 0)
-        self.parent.blocksMovement = False
+        self.gameMap.setBlocking(self.parent, False)
         self.parent.ai = None
+        self.gameMap.scheduler.remove(self.parent)
         self.parent.name = f"remains of {self.parent.name}"
-        self.parent.renderOrder = RenderOrder.CORPSE
+        self.gameMap.setRenderOrder(self.parent, RenderOrder.CORPSE)
 
         self.engine.messageLog.addMessage(deathMessage, deathMessageColour)
 
@@ -1,4 +1,6 @@
-from typing import Iterable, List, Reversible, Tuple
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Reversible, TextIO, Tuple
+import json
 import textwrap
 
 import tcod
@@ -7,10 +9,14 @@ from src.display import colours
 
 
 class Message:
+    __slots__ = ("plainText", "fg", "count", "_wrapCache")
+
     def __init__(self, text: str, fg: Tuple[int, int, int]):
         self.plainText = text
         self.fg = fg
         self.count = 1
+        # Wrapped lines by width, along with the count they were wrapped at.
+        self._wrapCache: Optional[Dict[int, Tuple[int, List[str]]]] = None
 
     @property
     def fullText(self) -> str:
@@ -19,10 +25,40 @@ class Message:
             return f"{self.plainText} (x{self.count})"
         return self.plainText
 
+    def wrap(self, width: int) -> List[str]:
+        """Return the full text wrapped to 'width', reusing the last result until the count changes."""
+        if self._wrapCache is None:
+            self._wrapCache = {}
+        cached = self._wrapCache.get(width)
+        if cached is None or cached[0] != self.count:
+            cached = self.count, list(MessageLog.wrap(self.fullText, width))
+            self._wrapCache[width] = cached
+        return cached[1]
+
 
 class MessageLog:
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
+    """
+    The most recent 'capacity' messages.
+
+    If 'spillPath' is given, messages pushed out of the log are appended to
+    that file as JSON lines of [text, fg, count] rather than being lost.
+    The file is opened when the first message is pushed out, and must be
+    closed with 'close'. 'onChange' is called whenever a message is added
+    or stacked.
+    """
+
+    def __init__(
+            self,
+            capacity: int = 1000,
+            spillPath: Optional[str] = None,
+            onChange: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.spillPath = spillPath
+        self.onChange = onChange
+        self._spillFile: Optional[TextIO] = None
+        # Messages added or stacked so far, so views of the log can tell when it has changed.
+        self.changes = 0
 
     def addMessage(
             self, text: str, fg: Tuple[int, int, int] = colours.white, *, stack: bool = True,
@@ -35,7 +71,26 @@ class MessageLog:
         if stack and self.messages and text == self.messages[-1].plainText:
             self.messages[-1].count += 1
         else:
+            if len(self.messages) == self.messages.maxlen:
+                self._spill(self.messages[0])
             self.messages.append(Message(text, fg))
+        self.changes += 1
+
+        if self.onChange:
+            self.onChange()
+
+    def close(self) -> None:
+        """Close the spill file, if it's open."""
+        if self._spillFile:
+            self._spillFile.close()
+            self._spillFile = None
+
+    def _spill(self, message: Message) -> None:
+        if self.spillPath is None:
+            return
+        if self._spillFile is None:
+            self._spillFile = open(self.spillPath, "a", encoding="utf-8")
+        self._spillFile.write(json.dumps([message.plainText, list(message.fg), message.count]) + "\n")
 
     def render(
             self, console: tcod.Console, x: int, y: int, width: int, height: int,
@@ -50,6 +105,9 @@ class MessageLog:
     def wrap(string: str, width: int) -> Iterable[str]:
         """Return a wrapped text message."""
         for line in string.splitlines():  # Handle newlines in messages.
+            if len(line) <= width and line.isprintable() and line.strip() == line and line:
+                yield line  # Already fits, which is most messages.
+                continue
             yield from textwrap.wrap(
                 line, width, expand_tabs=True,
             )
@@ -70,7 +128,7 @@ class MessageLog:
         yOffset = height - 1
 
         for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.fullText, width))):
+            for line in reversed(message.wrap(width)):
                 console.print(x=x, y=y + yOffset, string=line, fg=message.fg)
                 yOffset -= 1
                 if yOffset < 0:
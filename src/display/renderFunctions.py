@@ -15,7 +15,7 @@ def getNamesAtLocation(x: int, y: int, gameMap: GameMap) -> str:
         return ""
 
     names = ", ".join(
-        entity.name for entity in gameMap.entities if entity.x == x and entity.y == y
+        entity.name for entity in gameMap.getEntitiesAtLocation(x, y)
     )
 
     return names.capitalize()
@@ -42,9 +42,10 @@ def renderNamesAtMouseLocation(
         console: Console, x: int, y: int, engine: Engine
 ) -> None:
     mouseX, mouseY = engine.mouseLocation
+    originX, originY = engine.gameMap.cameraOrigin
 
     namesAtMouseLocation = getNamesAtLocation(
-        x=mouseX, y=mouseY, gameMap=engine.gameMap
+        x=mouseX + originX, y=mouseY + originY, gameMap=engine.gameMap
     )
 
     console.print(x=x, y=y, string=namesAtMouseLocation)
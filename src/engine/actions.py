@@ -3,13 +3,19 @@ from __future__ import annotations
 from typing import Optional, Tuple, TYPE_CHECKING
 from src.display import colours
 from src.engine import exceptions
+from src.entities.entity import Item
+
+# How far away, in tiles, the noise of a fight can be heard.
+NOISE_RADIUS = 12
 
 if TYPE_CHECKING:
     from src.engine.engine import Engine
-    from src.entities.entity import Entity, Actor, Item
+    from src.entities.entity import Entity, Actor
 
 
 class Action:
+    __slots__ = ("entity",)
+
     def __init__(self, entity: Actor) -> None:
         super().__init__()
         self.entity = entity
@@ -19,9 +25,17 @@ class Action:
         """Return the engine this action belongs to."""
         return self.entity.gameMap.engine
 
-    def perform(self, engine: Engine, entity: Entity) -> None:
+    def check(self) -> Optional[str]:
+        """
+        Return why this action is impossible, or None if it can be performed.
+        Cheap and without side effects, so callers can test actions before
+        choosing one. Possible by default.
+        """
+        return None
+
+    def apply(self) -> None:
         """
-        Perform this action with the objects needed to determine its scope.
+        Carry out this action, which 'check' has found possible.
 
         'self.engine' is the scope this action is being performed in.
 
@@ -31,34 +45,57 @@ class Action:
         """
         raise NotImplementedError()
 
+    def perform(self) -> None:
+        """Perform this action, raising exceptions.Impossible with the reason if it can't be."""
+        reason = self.check()
+        if reason is not None:
+            raise exceptions.Impossible(reason)
+        self.apply()
+
+    def tryPerform(self) -> bool:
+        """Perform this action if it's possible. Returns whether it was, rather than raising."""
+        if self.check() is not None:
+            return False
+        self.apply()
+        return True
+
 
 class PickupAction(Action):
     """Pickup an item and add it to the inventory, if there is room for it."""
 
+    __slots__ = ()
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
 
-    def perform(self) -> None:
-        actorLocationX = self.entity.x
-        actorLocationY = self.entity.y
+    @property
+    def item(self) -> Optional[Item]:
+        """Return the first item at the actor's location."""
+        for entity in self.engine.gameMap.getEntitiesAtLocation(self.entity.x, self.entity.y):
+            if isinstance(entity, Item):
+                return entity
+        return None
+
+    def check(self) -> Optional[str]:
+        if self.item is None:
+            return "There is nothing here to pick up."
         inventory = self.entity.inventory
+        if len(inventory.items) >= inventory.capacity:
+            return "Inventory is full."
+        return None
 
-        for item in self.engine.gameMap.items:
-            if actorLocationX == item.x and actorLocationY == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Inventory is full.")
-
-                self.engine.gameMap.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+    def apply(self) -> None:
+        item = self.item
+        self.engine.gameMap.removeEntity(item)
+        item.parent = self.entity.inventory
+        self.entity.inventory.items.append(item)
 
-                self.engine.messageLog.addMessage(f"You pick up the {item.name}!")
-                return
-
-        raise exceptions.Impossible("There is nothing here to pick up.")
+        self.engine.messageLog.addMessage(f"You pick up the {item.name}!")
 
 
 class ItemAction(Action):
+    __slots__ = ("item", "targetXY")
+
     def __init__(
             self, entity: Actor, item: Item, targetXY: Optional[Tuple[int, int]] = None
     ):
@@ -73,22 +110,31 @@ class ItemAction(Action):
         """Return the actor at this actions destination."""
         return self.engine.gameMap.getActorAtLocation(*self.targetXY)
 
-    def perform(self) -> None:
-        """Invoke the items ability, this action will be given to provide context."""
+    def apply(self) -> None:
+        """
+        Invoke the items ability, this action will be given to provide context.
+        The item may still find it impossible, raising exceptions.Impossible.
+        """
         self.item.consumeable.activate(self)
 
 
 class DropAction(ItemAction):
-    def perform(self) -> None:
+    __slots__ = ()
+
+    def apply(self) -> None:
         self.entity.inventory.drop(self.item)
 
 
 class WaitAction(Action):
-    def perform(self) -> None:
+    __slots__ = ()
+
+    def apply(self) -> None:
         pass
 
 
 class ActionWithDirection(Action):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
 
@@ -110,17 +156,20 @@ class ActionWithDirection(Action):
         """Return the actor at this actions destination."""
         return self.engine.gameMap.getActorAtLocation(*self.destXY)
 
-    def perform(self) -> None:
-        raise NotImplementedError()
-
 
 class MeleeAction(ActionWithDirection):
-    def perform(self) -> None:
-        target = self.targetActor
-        if not target:
-            raise exceptions.Impossible("Nothing to attack.")
+    __slots__ = ()
 
+    def check(self) -> Optional[str]:
+        if not self.targetActor:
+            return "Nothing to attack."
+        return None
+
+    def apply(self) -> None:
+        target = self.targetActor
         damage = self.entity.fighter.power - target.fighter.defence
+        # The sound of fighting wakes dormant actors nearby.
+        self.engine.gameMap.activity.noise(target.x, target.y, radius=NOISE_RADIUS)
         attackDesc = f"{self.entity.name.capitalize()} attacks {target.name}"
 
         if self.entity is self.engine.player:
@@ -142,28 +191,43 @@ class MeleeAction(ActionWithDirection):
 
 
 class MovementAction(ActionWithDirection):
-    def perform(self) -> None:
+    __slots__ = ()
+
+    def check(self) -> Optional[str]:
         destX, destY = self.destXY
+        gameMap = self.engine.gameMap
 
-        if not self.engine.gameMap.inBounds(destX, destY):
+        if not gameMap.inBounds(destX, destY):
             # Destination is out of bounds.
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
 
-        if not self.engine.gameMap.tiles['walkable'][destX, destY]:
+        if not gameMap.tiles['walkable'][destX, destY]:
             # Destination blocked by a tile.
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
 
-        if self.engine.gameMap.getBlockingEntityAtLocation(destX, destY):
+        if gameMap.getBlockingEntityAtLocation(destX, destY):
             # Destination blocked by an entity.
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
+
+        return None
 
+    def apply(self) -> None:
         self.entity.move(self.dx, self.dy)
 
 
 class BumpAction(ActionWithDirection):
-    def perform(self) -> None:
+    __slots__ = ()
+
+    def resolve(self) -> ActionWithDirection:
+        """Return the action this bump amounts to: an attack if there's an actor in the way, else a move."""
         if self.targetActor:
-            return MeleeAction(self.entity, self.dx, self.dy).perform()
+            return MeleeAction(self.entity, self.dx, self.dy)
 
         else:
-            return MovementAction(self.entity, self.dx, self.dy).perform()
+            return MovementAction(self.entity, self.dx, self.dy)
+
+    def check(self) -> Optional[str]:
+        return self.resolve().check()
+
+    def apply(self) -> None:
+        self.resolve().apply()
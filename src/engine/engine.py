@@ -1,52 +1,103 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 from tcod.console import Console
-from tcod.map import compute_fov
 
 from src.display.messageLog import MessageLog
 from src.engine.inputHandlers import MainGameEventHandler
 from src.display.renderFunctions import renderBar, renderNamesAtMouseLocation
-from src.engine import exceptions
+from src.engine.frameScheduler import FrameScheduler
+from src.engine.levelPregenerator import LevelPregenerator
+from src.engine.profiler import profiler
+from src.engine.turnScheduler import actionDelay
+from src.map.flowField import FlowField
+from src.map.procgen import buildLevel
 
 if TYPE_CHECKING:
     from src.entities.entity import Actor
     from src.map.gameMap import GameMap
     from src.engine.inputHandlers import EventHandler
 
+# How far past the longest sight on the map the player's flow field reaches, so that
+# actors which can see the player can still follow it around walls in the way.
+FLOW_FIELD_MARGIN = 8
+
 
 class Engine:
     gameMap: GameMap
 
     def __init__(self, player: Actor):
+        self.frameScheduler = FrameScheduler()
         self.eventHandler: EventHandler = MainGameEventHandler(self)
-        self.messageLog = MessageLog()
+        self.messageLog = MessageLog(onChange=self.frameScheduler.markDirty)
         self.mouseLocation = (0, 0)
         self.player = player
+        self._playerFlowField: Optional[FlowField] = None
+        self.turn = 0  # Turns taken by the player.
+        self.depth = 1  # The number of the current dungeon level.
+        # Where levels below this one come from, if there are any.
+        self.levels: Optional[LevelPregenerator] = None
+
+    @property
+    def eventHandler(self) -> EventHandler:
+        return self._eventHandler
+
+    @eventHandler.setter
+    def eventHandler(self, value: EventHandler) -> None:
+        self._eventHandler = value
+        self.frameScheduler.markDirty()
+
+    @property
+    def playerFlowField(self) -> FlowField:
+        """
+        A flow field rooted at the player, shared by every AI this turn.
+        Built on first use and discarded at the start of the next enemy turn.
+        Only the AIs which can see the player follow it, so it only covers the
+        area around the player they can see from.
+        """
+        if self._playerFlowField is None:
+            profiler.count("FlowField.builds")
+            radius = self.gameMap.perception.longestSight + FLOW_FIELD_MARGIN
+            self._playerFlowField = FlowField(self.gameMap, [(self.player.x, self.player.y)], radius=radius)
+        return self._playerFlowField
 
     def handleEnemyTurns(self) -> None:
-        for entity in set(self.gameMap.actors) - {self.player}:
-            if entity.ai:
-                try:
-                    entity.ai.perform()
-                except exceptions.Impossible:
-                    pass  # Ignore impossible action exceptions from AI.
+        self._playerFlowField = None
+        self.gameMap.perception.newTurn()
+        activity = self.gameMap.activity
+        activity.wakeAroundPlayer()
+        # Only the actors due to act within the time the player's action took are visited.
+        for entity in self.gameMap.scheduler.advance(actionDelay(self.player.speed)):
+            if activity.sleepIfDistant(entity):
+                continue
+            if profiler.enabled:
+                profiler.count(f"{type(entity.ai).__name__}.turns")
+            entity.ai.perform()
+
+    def descend(self) -> None:
+        """Move the player down to a new map, the next level of the dungeon."""
+        if self.levels is None:
+            raise RuntimeError("This dungeon has no levels below the current one.")
+        with profiler.phase("descend"):
+            oldMap = self.gameMap
+            self.depth += 1
+            self.gameMap = buildLevel(self, self.levels.take(self.depth))
+            oldMap.release()
+            self._playerFlowField = None
+        self.levels.prefetch(self.depth + 1)
+        self.updateFOV()
 
     def updateFOV(self):
         """Recompute the visible area based on the players point of view."""
-        self.gameMap.visible[:] = compute_fov(
-            self.gameMap.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
-            light_walls=True,
-        )
-        # If a tile is "visible" it should be added to "explored".
-        self.gameMap.explored |= self.gameMap.visible
+        self.gameMap.updateFOV(self.player.x, self.player.y, radius=8)
+        self.frameScheduler.markDirty()
 
     def render(self, console: Console) -> None:
-        self.gameMap.render(console)
+        with profiler.phase("render.map"):
+            self.gameMap.render(console)
 
-        self.messageLog.render(console=console, x=21, y=45, width=40, height=5)
+        with profiler.phase("render.log"):
+            self.messageLog.render(console=console, x=21, y=45, width=40, height=5)
 
         renderBar(
             console=console,
@@ -57,6 +108,9 @@ class Engine:
 
         renderNamesAtMouseLocation(console=console, x=21, y=44, engine=self)
 
+        if profiler.overlay:
+            profiler.renderOverlay(console, x=0, y=0)
+
         # console.print(
         #     x=1,
         #     y=47,
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Optional
+
+
+class FrameScheduler:
+    """
+    Decides when the main loop needs to draw a frame.
+
+    Anything which changes what's on screen calls 'markDirty': actions,
+    FOV updates, new log messages, switching event handler and the mouse
+    moving onto another tile. While nothing has changed the loop skips the
+    clear, render and present cycle and can block waiting for input. If
+    'maxFPS' is given, frames are drawn at most that often.
+
+    If 'keyRepeatsPerFrame' is given, at most that many auto-repeated key
+    presses are let through between frames, see allowKeyRepeat, so a held
+    key can't get ahead of what's on screen however many batches of events
+    are handled before a frame is due.
+    """
+
+    def __init__(
+            self,
+            maxFPS: Optional[float] = None,
+            clock: Callable[[], float] = time.perf_counter,
+            keyRepeatsPerFrame: Optional[int] = None,
+    ):
+        self.maxFPS = maxFPS
+        self.clock = clock
+        self.keyRepeatsPerFrame = keyRepeatsPerFrame
+        self._keyRepeats = 0  # Auto-repeated key presses let through since the last frame.
+        self.dirty = True
+        self.framesRendered = 0
+        self.framesSkipped = 0
+        self._lastFrame = float("-inf")
+
+    def markDirty(self) -> None:
+        """Draw a new frame at the next opportunity."""
+        self.dirty = True
+
+    def timeout(self) -> Optional[float]:
+        """
+        Return the seconds until the next frame is due, 0 if it's due now,
+        or None if no frame is needed until something changes.
+        """
+        if not self.dirty:
+            return None
+        if not self.maxFPS:
+            return 0.0
+        return max(0.0, self._lastFrame + 1 / self.maxFPS - self.clock())
+
+    def allowKeyRepeat(self) -> bool:
+        """Return True, counting it, if another auto-repeated key press can be handled before the next frame."""
+        if self.keyRepeatsPerFrame is not None and self._keyRepeats >= self.keyRepeatsPerFrame:
+            return False
+        self._keyRepeats += 1
+        return True
+
+    def beginFrame(self) -> bool:
+        """Return True if a frame should be drawn now, otherwise count the frame as skipped."""
+        if self.timeout() == 0.0:
+            return True
+        self.framesSkipped += 1
+        return False
+
+    def endFrame(self) -> None:
+        """Record that a frame has been drawn and presented."""
+        self.dirty = False
+        self._keyRepeats = 0
+        self._lastFrame = self.clock()
+        self.framesRendered += 1
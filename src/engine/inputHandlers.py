@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Optional, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
+import bisect
+import sys
 import tcod.event
 
 from src.engine import actions
@@ -13,6 +15,7 @@ from src.engine.actions import (
 
 from src.display import colours
 from src.engine import exceptions
+from src.engine.profiler import profiler
 from src.entities.entity import Item
 
 if TYPE_CHECKING:
@@ -70,20 +73,32 @@ class EventHandler(tcod.event.EventDispatch[Action]):
         if action is None:
             return False
 
+        self.engine.frameScheduler.markDirty()
+        reason = action.check()
+        if reason is not None:
+            self.engine.messageLog.addMessage(reason, colours.impossible)
+            return False  # Skip enemy turn on impossible actions.
         try:
-            action.perform()
+            with profiler.phase("perform"):
+                action.apply()
         except exceptions.Impossible as exc:
+            # Some actions, like using an item, only find out they're impossible part way through.
             self.engine.messageLog.addMessage(exc.args[0], colours.impossible)
-            return False  # Skip enemy turn on exceptions.
+            return False
 
-        self.engine.handleEnemyTurns()
+        with profiler.phase("enemyTurns"):
+            self.engine.handleEnemyTurns()
 
-        self.engine.updateFOV()
+        with profiler.phase("updateFOV"):
+            self.engine.updateFOV()
+        self.engine.turn += 1
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
         if self.engine.gameMap.inBounds(event.tile.x, event.tile.y):
-            self.engine.mouseLocation = event.tile.x, event.tile.y
+            if self.engine.mouseLocation != (event.tile.x, event.tile.y):
+                self.engine.mouseLocation = event.tile.x, event.tile.y
+                self.engine.frameScheduler.markDirty()
 
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
@@ -147,7 +162,7 @@ class InventoryEventHandler(AskUserEventHandler):
         if height <= 3:
             height = 3
 
-        if self.engine.player.x <= 30:
+        if self.engine.player.x - self.engine.gameMap.cameraOrigin[0] <= 30:
             x = 40
         else:
             x = 0
@@ -261,19 +276,84 @@ CURSOR_Y_KEYS = {
     tcod.event.K_PAGEDOWN: 10,
 }
 
+# The width messages are wrapped to in the history viewer until it's drawn, fitting the 80 column
+# screen the game is laid out for. It's rewrapped if it's drawn on a console of another width.
+HISTORY_WRAP_WIDTH = 80 - 6 - 2
+
 
 class HistoryViewer(EventHandler):
-    """Print the message log on a larger window which can be navigated."""
+    """
+    Print the message log on a larger window which can be navigated.
+
+    Scrolling moves by wrapped line. 'cursor' counts the lines between the
+    bottom of the window and the end of the log, and 'lineEnds[i]' is the
+    number of lines taken by the newest i + 1 messages. The index is built
+    from the newest message backwards, only as far as has been scrolled, so
+    opening the viewer and each keypress don't depend on the history's size.
+    If a message is logged while the viewer is open, e.g. an error, the index
+    is rebuilt and the view moves back to the end of the log.
+    Each frame only the lines in view are drawn, onto a console kept between
+    frames.
+    """
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.logLength = len(engine.messageLog.messages)
-        self.cursor = self.logLength - 1
+        # The log itself rather than a copy, which would cost the log's length on opening.
+        # Messages are looked up counting back from the newest, which is cheap for a deque
+        # near the end scrolled to.
+        self.messages = engine.messageLog.messages
+        self.logChanges = engine.messageLog.changes
+        self.logConsole: Optional[tcod.Console] = None
+        self.wrapWidth = HISTORY_WRAP_WIDTH
+        self.lineEnds: List[int] = []
+        self.cursor = 0
+
+    def resetIfLogChanged(self) -> None:
+        """Start again from the end of the log if a message has been added or stacked since it was indexed."""
+        changes = self.engine.messageLog.changes
+        if changes != self.logChanges:
+            self.logChanges = changes
+            self.lineEnds = []
+            self.cursor = 0
+
+    @property
+    def fullyIndexed(self) -> bool:
+        return len(self.lineEnds) == len(self.messages)
+
+    def indexLines(self, line: int) -> None:
+        """Wrap older messages until the index reaches past 'line' or covers the whole log."""
+        total = self.lineEnds[-1] if self.lineEnds else 0
+        while total <= line and not self.fullyIndexed:
+            total += len(self.messages[-1 - len(self.lineEnds)].wrap(self.wrapWidth))
+            self.lineEnds.append(total)
+
+    def clampLine(self, line: int) -> int:
+        """Return 'line' limited to the lines of the log."""
+        self.indexLines(line)
+        if self.fullyIndexed:
+            line = min(line, self.lastLine)
+        return max(0, line)
+
+    @property
+    def lastLine(self) -> int:
+        """The oldest line of the log. Wraps every message the first time it's used."""
+        self.indexLines(sys.maxsize)
+        return max(0, self.lineEnds[-1] - 1) if self.lineEnds else 0
 
     def onRender(self, console: tcod.Console) -> None:
         super().onRender(console)  # Draw the main state as the background.
 
-        logConsole = tcod.Console(console.width - 6, console.height - 6)
+        width, height = console.width - 6, console.height - 6
+        if self.logConsole is None or (self.logConsole.width, self.logConsole.height) != (width, height):
+            self.logConsole = tcod.Console(width, height)
+        self.resetIfLogChanged()
+        if self.wrapWidth != max(1, width - 2):
+            # Messages wrap differently at a new width, so start again from the end.
+            self.wrapWidth = max(1, width - 2)
+            self.lineEnds = []
+            self.cursor = 0
+        logConsole = self.logConsole
+        logConsole.clear()
 
         # Draw a frame with a custom banner title.
         logConsole.draw_frame(0, 0, logConsole.width, logConsole.height)
@@ -281,39 +361,50 @@ class HistoryViewer(EventHandler):
             0, 0, logConsole.width, 1, "┤Message History├", alignment=tcod.CENTER
         )
 
-        # Render the message log using the cursor parameter.
-        self.engine.messageLog.renderMessages(
-            logConsole,
-            1,
-            1,
-            logConsole.width - 2,
-            logConsole.height - 2,
-            self.engine.messageLog.messages[: self.cursor + 1],
-        )
+        # Draw upwards from the cursor's line at the bottom until the window is full.
+        self.indexLines(self.cursor + height - 2)
+        y = height - 2
+        line = self.cursor
+        index = bisect.bisect_right(self.lineEnds, line)
+        while y > 0 and index < len(self.lineEnds):
+            message = self.messages[-1 - index]
+            lines = message.wrap(self.wrapWidth)
+            below = line - (self.lineEnds[index] - len(lines))  # Lines of this message under the cursor.
+            for text in reversed(lines[: len(lines) - below]):
+                logConsole.print(x=1, y=y, string=text, fg=message.fg)
+                y -= 1
+                if y == 0:
+                    break
+            line = self.lineEnds[index]
+            index += 1
+
         logConsole.blit(console, 3, 3)
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> None:
+        self.engine.frameScheduler.markDirty()
+        self.resetIfLogChanged()
+
         # Fancy conditional movement ot make it feel right.
         if event.sym in CURSOR_Y_KEYS:
-            adjust = CURSOR_Y_KEYS[event.sym]
+            older = -CURSOR_Y_KEYS[event.sym]  # Lines counted back from the end of the log.
 
-            if adjust < 0 and self.cursor == 0:
+            if older > 0 and self.cursor == self.clampLine(self.cursor + older) and self.fullyIndexed:
                 # Only move from the top to the bottom when you're on the edge.
-                self.cursor = self.logLength - 1
+                self.cursor = 0
 
-            elif adjust > 0 and self.cursor == self.logLength - 1:
+            elif older < 0 and self.cursor == 0:
                 # Same with bottom to top movement.
-                self.cursor = 0
+                self.cursor = self.lastLine
 
             else:
                 # Otherwise move while staying clamped to the bounds of the history.
-                self.cursor = max(0, min(self.cursor + adjust, self.logLength - 1))
+                self.cursor = self.clampLine(self.cursor + older)
 
         elif event.sym == tcod.event.K_HOME:
-            self.cursor = 0  # Move directly to top message.
+            self.cursor = self.lastLine  # Move directly to the top line.
 
         elif event.sym == tcod.event.K_END:
-            self.cursor = self.logLength - 1  # Move directly to the last message.
+            self.cursor = 0  # Move directly to the last line.
 
         else:  # Any other key moves back to main game state.
             self.engine.eventHandler = MainGameEventHandler(self.engine)
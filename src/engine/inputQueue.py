@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable, List, Optional
+
+import tcod.event
+
+
+def coalesceEvents(
+        events: Iterable[tcod.event.Event], *, allowKeyRepeat: Optional[Callable[[], bool]] = None,
+) -> List[tcod.event.Event]:
+    """
+    Return a batch of events with the redundant ones dropped, ready to dispatch.
+
+    Each run of consecutive MouseMotion events is collapsed into its last
+    event, since only the latest mouse position matters. 'allowKeyRepeat' is
+    called for each auto-repeated key press from a held key, which is dropped
+    if it returns False, e.g. FrameScheduler.allowKeyRepeat so that a held
+    movement key can't queue up turns faster than frames are drawn. Without
+    it every repeat is kept. Other events are kept in order.
+    """
+    batch: List[tcod.event.Event] = []
+
+    for event in events:
+        if isinstance(event, tcod.event.MouseMotion):
+            if batch and isinstance(batch[-1], tcod.event.MouseMotion):
+                batch[-1] = event
+                continue
+
+        elif isinstance(event, tcod.event.KeyDown) and event.repeat:
+            if allowKeyRepeat is not None and not allowKeyRepeat():
+                continue
+
+        batch.append(event)
+
+    return batch
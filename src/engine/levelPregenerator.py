@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import concurrent.futures
+import os
+from typing import Dict, Optional
+
+import numpy as np  # type: ignore
+
+from src.engine.profiler import profiler
+from src.map.procgen import Level, generateLevel
+
+
+class LevelPregenerator:
+    """
+    Generates the dungeon levels below the current one ahead of time.
+
+    Up to 'depth' levels past the last one taken are generated in a pool
+    of 'workers' processes, each from a seed derived from 'seed' and the
+    level number, so a level is the same whether it was generated ahead of
+    time or not. Workers only hand back a procgen.Level, the level's arrays
+    and compact spawn records, which the caller turns into a GameMap with
+    procgen.buildLevel. With a depth or worker count of 0 levels are
+    generated on demand instead.
+
+    Workers run at a lower priority, so they only use the CPU time the game
+    leaves idle.
+
+    'levelOptions' are the keyword arguments of procgen.generateLevel.
+    """
+
+    def __init__(self, *, seed: Optional[int] = None, depth: int = 1, workers: int = 1, **levelOptions):
+        # Without a seed, pick one so that every level still comes from the same one.
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.depth = depth
+        self.levelOptions = levelOptions
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        if depth > 0 and workers > 0:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_lowerPriority
+            )
+        self._pending: Dict[int, concurrent.futures.Future] = {}
+
+    def seedFor(self, level: int) -> list:
+        return [self.seed, level]
+
+    def take(self, level: int) -> Level:
+        """
+        Return level number 'level', waiting for it if it's still being
+        generated. Call prefetch once it's built, to generate the ones after it.
+        """
+        future = self._pending.pop(level, None)
+        if future is None:
+            if profiler.enabled:
+                profiler.count("LevelPregenerator.misses")
+            result = generateLevel(self.seedFor(level), **self.levelOptions)
+        else:
+            result = future.result()
+        return result
+
+    def prefetch(self, level: int) -> None:
+        """Start generating levels 'level' onwards, up to 'depth' of them, unless they already are."""
+        if self._executor is None:
+            return
+        for ahead in range(level, level + self.depth):
+            if ahead not in self._pending:
+                self._pending[ahead] = self._executor.submit(
+                    generateLevel, self.seedFor(ahead), **self.levelOptions
+                )
+
+    def close(self) -> None:
+        """Stop the worker processes, dropping any levels not yet taken."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
+
+
+def _lowerPriority() -> None:
+    if hasattr(os, "nice"):  # Not on Windows.
+        os.nice(10)
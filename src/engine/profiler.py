@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import collections
+import csv
+import json
+import time
+from typing import Deque, Dict, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tcod.console import Console
+
+
+class _NullPhase:
+    """Stands in for a phase while profiling is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+
+
+class PhaseStats:
+    __slots__ = ("calls", "total", "longest", "last")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.last = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class Profiler:
+    """
+    Timers around the phases of a turn and frame, and named counters.
+
+    Code is instrumented with 'with profiler.phase("name"):' blocks and
+    'profiler.count("name")' calls. While disabled a phase is a shared no-op
+    and a count returns straight away, so the hooks can stay in place.
+    While enabled every phase is kept, up to 'maxEvents', for export as a
+    Chrome trace (load it at chrome://tracing or ui.perfetto.dev), and
+    summarised per phase for the overlay and the CSV export.
+    """
+
+    def __init__(self, maxEvents: int = 100_000):
+        self.enabled = False
+        self.overlay = False  # Draw the phase timings over the game.
+        self.phases: Dict[str, PhaseStats] = {}
+        self.counters: Dict[str, int] = collections.Counter()
+        # Name, start and duration in seconds of each recorded phase.
+        self.events: Deque[Tuple[str, float, float]] = collections.deque(maxlen=maxEvents)
+        self._origin = time.perf_counter()
+
+    def enable(self, overlay: bool = False) -> None:
+        self.enabled = True
+        self.overlay = overlay
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.phases.clear()
+        self.counters.clear()
+        self.events.clear()
+        self._origin = time.perf_counter()
+
+    def phase(self, name: str):
+        """Return a context manager timing the block it wraps as the phase 'name'."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += amount
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.calls += 1
+        stats.total += duration
+        stats.last = duration
+        stats.longest = max(stats.longest, duration)
+        self.events.append((name, start, duration))
+
+    def summary(self) -> List[str]:
+        """Return a line for each phase and counter, slowest phases first."""
+        lines = [
+            f"{name}: {stats.calls} calls, mean {stats.mean * 1000:.3f}ms, max {stats.longest * 1000:.3f}ms"
+            for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].total)
+        ]
+        lines.extend(f"{name}: {value}" for name, value in sorted(self.counters.items()))
+        return lines
+
+    def renderOverlay(self, console: Console, x: int, y: int) -> None:
+        """Draw the last and mean time of each phase, with the top left corner at x, y."""
+        for i, (name, stats) in enumerate(sorted(self.phases.items())):
+            console.print(
+                x=x,
+                y=y + i,
+                string=f"{name:<12}{stats.last * 1000:6.2f}{stats.mean * 1000:6.2f}ms",
+                fg=(255, 255, 0),
+            )
+
+    def writeChromeTrace(self, path: str) -> None:
+        """Write the recorded phases, and the counters' final values, in Chrome's trace event format."""
+        traceEvents: List[dict] = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": 0,
+                "tid": 0,
+            }
+            for name, start, duration in self.events
+        ]
+        end = (time.perf_counter() - self._origin) * 1e6
+        traceEvents.extend(
+            {"name": name, "ph": "C", "ts": end, "pid": 0, "args": {"value": value}}
+            for name, value in self.counters.items()
+        )
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, file)
+
+    def writeCSV(self, path: str) -> None:
+        """Write a row per phase with its timings in milliseconds, then a row per counter."""
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "kind", "count", "totalMs", "meanMs", "maxMs"])
+            for name, stats in self.phases.items():
+                writer.writerow(
+                    [
+                        name,
+                        "phase",
+                        stats.calls,
+                        f"{stats.total * 1000:.4f}",
+                        f"{stats.mean * 1000:.4f}",
+                        f"{stats.longest * 1000:.4f}",
+                    ]
+                )
+            for name, value in self.counters.items():
+                writer.writerow([name, "counter", value, "", "", ""])
+
+
+# The profiler shared by all instrumented code.
+profiler = Profiler()
@@ -0,0 +1,274 @@
+"""
+Recording play sessions and replaying them headless.
+
+A recording is a JSON lines file. The first line is a header holding the
+newEngine options the game was started with, including the dungeon seed,
+so the replay starts from the same dungeon. Every following line is either
+an event dispatched to the game, with the turn it was dispatched on:
+
+    {"turn": 12, "event": {"type": "KeyDown", "sym": 104, "scancode": 11, "mod": 0, "repeat": false}}
+
+or a checkpoint, a hash of the game state as it was after a turn:
+
+    {"turn": 100, "hash": "9f2c..."}
+
+or an exception raised by the game while handling the event before it,
+which the game loop logged as a message and carried on from:
+
+    {"turn": 57, "error": "IndexError"}
+
+Replaying feeds the events back through EventHandler.handleEvents as fast as
+possible, checking the turn of each event and the hash at each checkpoint,
+so a recording is both a benchmark and a regression test.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+import traceback
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+from src.display import colours
+from src.engine.setup import newEngine
+from src.engine.simulation import SimulationReport
+from src.entities.componentStore import store
+
+if TYPE_CHECKING:
+    from src.engine.engine import Engine
+
+REPLAY_VERSION = 1
+
+# Checkpoint the game state after every this many turns.
+CHECKPOINT_TURNS = 100
+
+# Columns of the component store included in the state hash.
+HASHED_COLUMNS = ("x", "y", "ch", "alive", "hp", "maxHP", "power", "defence")
+
+
+class ReplayError(Exception):
+    """Raised when a replay doesn't play out as it was recorded, or can't be read."""
+
+
+def stateHash(engine: Engine) -> str:
+    """
+    Return a hash of the state of the game: the turn, the level and its clock,
+    the player, every entity on the map and the number of messages logged.
+    Entities are hashed in an order which doesn't depend on their component
+    store rows, so the hash is the same in any process.
+    """
+    gameMap = engine.gameMap
+    rows = store.rowsOnMap(gameMap.mapId)
+    entities = np.zeros(len(rows), dtype=[(column, getattr(store, column).dtype) for column in HASHED_COLUMNS])
+    for column in HASHED_COLUMNS:
+        entities[column] = getattr(store, column)[rows]
+    entities.sort(order=list(HASHED_COLUMNS))
+
+    player = engine.player
+    summary = [
+        engine.turn,
+        engine.depth,
+        gameMap.scheduler.time,
+        player.x,
+        player.y,
+        player.fighter.hp,
+        len(player.inventory.items),
+        len(engine.messageLog.messages),
+    ]
+    digest = hashlib.blake2b(json.dumps(summary).encode("utf-8"), digest_size=16)
+    digest.update(entities.tobytes())
+    return digest.hexdigest()
+
+
+def encodeEvent(event: tcod.event.Event) -> Optional[Dict[str, Any]]:
+    """Return an event as a JSON object, or None if it's a kind the game ignores."""
+    if isinstance(event, tcod.event.KeyDown):
+        return {
+            "type": "KeyDown",
+            "sym": int(event.sym),
+            "scancode": int(event.scancode),
+            "mod": int(event.mod),
+            "repeat": bool(event.repeat),
+        }
+    if isinstance(event, tcod.event.MouseMotion):
+        return {"type": "MouseMotion", "position": list(event.position), "tile": list(event.tile)}
+    if isinstance(event, tcod.event.MouseButtonDown):
+        return {"type": "MouseButtonDown", "position": list(event.position), "button": int(event.button)}
+    if isinstance(event, tcod.event.Quit):
+        return {"type": "Quit"}
+    return None
+
+
+def decodeEvent(data: Dict[str, Any]) -> tcod.event.Event:
+    """Return the event encoded by encodeEvent."""
+    kind = data["type"]
+    if kind == "KeyDown":
+        return tcod.event.KeyDown(
+            scancode=tcod.event.Scancode(data["scancode"]),
+            sym=tcod.event.KeySym(data["sym"]),
+            mod=tcod.event.Modifier(data["mod"]),
+            repeat=data["repeat"],
+        )
+    if kind == "MouseMotion":
+        return tcod.event.MouseMotion(position=tuple(data["position"]), tile=tuple(data["tile"]))
+    if kind == "MouseButtonDown":
+        return tcod.event.MouseButtonDown(
+            position=tuple(data["position"]), button=tcod.event.MouseButton(data["button"]),
+        )
+    if kind == "Quit":
+        return tcod.event.Quit()
+    raise ReplayError(f"Unknown event type {kind!r}.")
+
+
+class Recorder:
+    """
+    Records the events dispatched to a game, and checkpoints of its state, to 'path'.
+
+    'options' are the keyword arguments the engine was made with by newEngine.
+    Call record with each event before it's handled and checkpoint after,
+    or recordError with the exception if handling it raised one.
+    The file is line buffered, so a session ended by quitting is kept whole.
+    """
+
+    def __init__(self, path: str, engine: Engine, options: Dict[str, Any], checkpointTurns: int = CHECKPOINT_TURNS):
+        if engine.levels is None:
+            raise ValueError("Only games made by newEngine can be recorded.")
+        self.engine = engine
+        self.checkpointTurns = checkpointTurns
+        self._lastTurn = engine.turn
+        self._lastCheckpoint: Optional[int] = None
+        self._handling = False
+        self._file = open(path, "w", buffering=1)
+        header = {
+            "version": REPLAY_VERSION,
+            # The seed actually used, in case the options left it to chance.
+            "options": dict(options, seed=engine.levels.seed),
+            "activeRadius": engine.gameMap.activity.radius,
+        }
+        self._write(header)
+
+    def record(self, event: tcod.event.Event) -> None:
+        data = encodeEvent(event)
+        if data is not None:
+            self._write({"turn": self.engine.turn, "event": data})
+            self._handling = True
+
+    def recordError(self, exc: Exception) -> None:
+        """Record that handling the last event raised 'exc'. Exceptions raised between events can't be replayed, so are left out."""
+        if self._handling:
+            self._write({"turn": self.engine.turn, "error": type(exc).__name__})
+            self._handling = False
+
+    def checkpoint(self) -> None:
+        """Write a hash of the game state if a checkpoint's turn has just been reached."""
+        self._handling = False
+        turn = self.engine.turn
+        if turn != self._lastTurn and turn % self.checkpointTurns == 0:
+            self._writeCheckpoint()
+        self._lastTurn = turn
+
+    def close(self) -> None:
+        """Checkpoint the final state, unless that was just done, and close the file."""
+        if self._lastCheckpoint != self.engine.turn:
+            self._writeCheckpoint()
+        self._file.close()
+
+    def _writeCheckpoint(self) -> None:
+        self._lastCheckpoint = self.engine.turn
+        self._write({"turn": self.engine.turn, "hash": stateHash(self.engine)})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record) + "\n")
+
+
+class ReplayReport(SimulationReport):
+    """Timing and end state of a replay, with the number of checkpoints it matched."""
+
+    def __init__(self, checkpoints: int, *args):
+        super().__init__(*args)
+        self.checkpoints = checkpoints
+
+    def summary(self) -> str:
+        return f"{super().summary()}\nCheckpoints matched: {self.checkpoints}"
+
+
+def replay(path: str, *, console: Optional[tcod.Console] = None, **engineOptions) -> ReplayReport:
+    """
+    Replay the recording at 'path' headless, as fast as possible.
+
+    A new engine is made as recorded, with 'engineOptions' overriding the
+    recorded newEngine options, e.g. to pre-generate levels. Each event is
+    dispatched through EventHandler.handleEvents as in the real game loop,
+    and if 'console' is given rendered offscreen as decided by the engine's
+    frame scheduler. Raises ReplayError as soon as an event comes up on a
+    different turn than it was recorded on, or a checkpoint's hash differs.
+    An exception raised by the game is logged as a message, as the game loop
+    does, if the recording has it, and otherwise raises ReplayError.
+    """
+    with open(path) as file:
+        try:
+            header = json.loads(file.readline())
+            records = [json.loads(line) for line in file if line.strip()]
+        except json.JSONDecodeError as exc:
+            raise ReplayError(f"{path} is not a recording: {exc}") from exc
+    if header.get("version") != REPLAY_VERSION:
+        raise ReplayError(f"{path} is recording version {header.get('version')}, expected {REPLAY_VERSION}.")
+
+    engine = newEngine(**{**header["options"], **engineOptions})
+    engine.gameMap.activity.radius = header["activeRadius"]
+    # Decoded up front, so that only the game itself is timed.
+    steps = [
+        (record["turn"], "event", decodeEvent(record["event"])) if "event" in record
+        else (record["turn"], "error", record["error"]) if "error" in record
+        else (record["turn"], "hash", record["hash"])
+        for record in records
+    ]
+
+    latencies: List[float] = []
+    checkpoints = 0
+    clock = time.perf_counter
+    start = clock()
+
+    # The name of the exception the last event raised, until it's matched against the recording.
+    raised: Optional[str] = None
+    for turn, kind, step in steps:
+        if kind == "error":
+            if raised != step:
+                actually = f"raised {raised}" if raised is not None else "didn't raise"
+                raise ReplayError(f"Turn {turn} was recorded raising {step}, but {actually}.")
+            raised = None
+            continue
+        if raised is not None:
+            raise ReplayError(f"Turn {turn} raised {raised}, which wasn't recorded.")
+
+        if kind == "hash":
+            actual = stateHash(engine)
+            if actual != step:
+                raise ReplayError(f"The state after turn {turn} was {actual}, recorded as {step}.")
+            checkpoints += 1
+            continue
+
+        if engine.turn != turn:
+            raise ReplayError(f"An event recorded on turn {turn} came up on turn {engine.turn}.")
+        stepStart = clock()
+        # noinspection PyBroadException
+        try:
+            engine.eventHandler.handleEvents(step)
+        except SystemExit:
+            break  # The recorded session was quit here.
+        except Exception as exc:
+            raised = type(exc).__name__
+            engine.messageLog.addMessage(traceback.format_exc(), colours.error)
+
+        if console is not None and engine.frameScheduler.beginFrame():
+            console.clear()
+            engine.eventHandler.onRender(console=console)
+            engine.frameScheduler.endFrame()
+        latencies.append(clock() - stepStart)
+    if raised is not None:
+        raise ReplayError(f"The last event raised {raised}, which wasn't recorded.")
+
+    return ReplayReport(checkpoints, engine, len(latencies), engine.turn, latencies, clock() - start)
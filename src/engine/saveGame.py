@@ -0,0 +1,410 @@
+"""
+A versioned binary save format for the whole game state.
+
+A save file is a header followed by a sequence of sections, each a 4 byte
+tag, a uint64 length and a payload. Map layers are written as raw NumPy
+buffers and entities as one packed record per entity, so saving and
+loading costs a handful of bulk array copies rather than walking and
+pickling the object graph. Sections are read one at a time by the loader.
+
+A map whose layers are memory mapped files, see GameMap's 'storageDir', is
+saved with a STOR section naming their directory in place of the three layer
+sections. Loading maps the files again rather than reading them, so the save
+relies on that directory, and sees any changes made to it since.
+
+Sections, in order:
+    META  JSON: map size, turn, level, scheduler time, class and name tables, the player, message log, handler
+          and the seed and options the dungeon's levels are generated from.
+    STOR  The directory of the memory mapped layers, UTF-8. If present, TILE, VISI and EXPL are left out.
+    TILE  The tiles layer, Fortran ordered.
+    VISI  The visible layer, Fortran ordered.
+    EXPL  The explored layer, Fortran ordered.
+    ENTS  One ENTITY_DT record per entity.
+    PATH  The x, y pairs of every saved AI path, indexed by the ENTS records.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Type, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from src.components.ai import BaseAI, HostileEnemy
+from src.components.consumeable import Consumeable, HealingConsumeable
+from src.components.fighter import Fighter
+from src.components.inventory import Inventory
+from src.display.messageLog import Message
+from src.engine import inputHandlers
+from src.engine.engine import Engine
+from src.engine.levelPregenerator import LevelPregenerator
+from src.entities.componentStore import store
+from src.entities.entity import Actor, Entity, Item
+from src.map import tileTypes
+from src.map.gameMap import GameMap
+from src.map.renderOrder import RenderOrder
+
+if TYPE_CHECKING:
+    from src.engine.inputHandlers import EventHandler
+
+MAGIC = b"TCODSAVE"
+VERSION = 6
+
+_header = struct.Struct("<8sH")
+_sectionHeader = struct.Struct("<4sQ")
+
+ACTOR, ITEM = 0, 1
+
+# Values of an ENTITY_DT "nextTurn" which aren't times.
+UNSCHEDULED, PARKED = -1, -2
+
+# Packed record for an entity and its components. Indexes refer to the META tables.
+ENTITY_DT = np.dtype(
+    [
+        ("kind", np.uint8),  # ACTOR or ITEM.
+        ("x", np.int32),
+        ("y", np.int32),
+        ("ch", np.int32),  # Unicode codepoint.
+        ("fg", "3B"),
+        ("name", np.int32),  # Index into the names table.
+        ("renderOrder", np.uint8),
+        ("blocks", np.bool_),
+        ("container", np.int32),  # Index of the actor holding this item, -1 if on the map.
+        # Actors only.
+        ("ai", np.int8),  # Index into the AI class table, -1 if dead.
+        ("sight", np.int32),
+        ("speed", np.int32),
+        ("nextTurn", np.int64),  # Scheduler time of the next action, UNSCHEDULED or PARKED.
+        ("hp", np.int32),
+        ("maxHP", np.int32),
+        ("power", np.int32),
+        ("defence", np.int32),
+        ("capacity", np.int32),
+        ("lastSeen", "2i4"),  # -1, -1 if none.
+        ("pathStart", np.int32),  # Slice of the PATH section.
+        ("pathEnd", np.int32),
+        # Items only.
+        ("consumeable", np.int8),  # Index into the consumeable class table.
+        ("amount", np.int32),
+    ]
+)
+
+# Classes which can be saved, looked up by name when loading.
+AI_CLASSES: Dict[str, Type[BaseAI]] = {cls.__name__: cls for cls in (HostileEnemy,)}
+CONSUMEABLE_CLASSES: Dict[str, Type[Consumeable]] = {
+    cls.__name__: cls for cls in (HealingConsumeable,)
+}
+HANDLER_CLASSES: Dict[str, Type[EventHandler]] = {
+    cls.__name__: cls
+    for cls in (
+        inputHandlers.MainGameEventHandler,
+        inputHandlers.GameOverEventHandler,
+        inputHandlers.HistoryViewer,
+        inputHandlers.InventoryActiveHandler,
+        inputHandlers.InventoryDropHandler,
+    )
+}
+
+
+class SaveFormatError(Exception):
+    """Raised when a file isn't a save file this version can load."""
+
+
+def saveGame(engine: Engine, path: str) -> None:
+    """Write the full state of 'engine' to 'path'."""
+    gameMap = engine.gameMap
+    if not isinstance(gameMap.tiles, np.ndarray):
+        raise TypeError(f"Saving a {type(gameMap).__name__} isn't supported.")
+
+    # Map entities first, then the items held by actors.
+    entities: List[Entity] = list(gameMap.entities)
+    containers: List[int] = [-1] * len(entities)
+    for index, entity in enumerate(list(entities)):
+        if isinstance(entity, Actor):
+            for item in entity.inventory.items:
+                entities.append(item)
+                containers.append(index)
+
+    records, paths, names, aiNames, consumeableNames = _packEntities(entities)
+    records["container"] = containers
+    records["nextTurn"] = [_nextTurn(gameMap, entity) for entity in entities]
+
+    meta = {
+        "width": gameMap.width,
+        "height": gameMap.height,
+        "turn": engine.turn,
+        "depth": engine.depth,
+        "time": gameMap.scheduler.time,
+        "player": entities.index(engine.player),
+        "names": names,
+        "aiClasses": aiNames,
+        "consumeableClasses": consumeableNames,
+        "messages": [[m.plainText, list(m.fg), m.count] for m in engine.messageLog.messages],
+        "handler": type(engine.eventHandler).__name__,
+        # None if the dungeon has no levels below this one.
+        "levels": None if engine.levels is None else {
+            "seed": engine.levels.seed,
+            "options": engine.levels.levelOptions,
+        },
+    }
+
+    with open(path, "wb") as file:
+        file.write(_header.pack(MAGIC, VERSION))
+        _writeSection(file, b"META", json.dumps(meta).encode("utf-8"))
+        if gameMap.storageDir is not None:
+            gameMap.flush()
+            _writeSection(file, b"STOR", os.path.abspath(gameMap.storageDir).encode("utf-8"))
+        else:
+            _writeSection(file, b"TILE", gameMap.tiles.tobytes(order="F"))
+            _writeSection(file, b"VISI", gameMap.visible.tobytes(order="F"))
+            _writeSection(file, b"EXPL", gameMap.explored.tobytes(order="F"))
+        _writeSection(file, b"ENTS", records.tobytes())
+        _writeSection(file, b"PATH", paths.tobytes())
+
+
+def loadGame(path: str, *, pregenDepth: int = 0, pregenWorkers: int = 0) -> Engine:
+    """
+    Return a new Engine holding the game state saved at 'path'.
+    The levels below are generated as in newEngine, from the saved seed.
+    """
+    with open(path, "rb") as file:
+        magic, version = _header.unpack(file.read(_header.size))
+        if magic != MAGIC:
+            raise SaveFormatError(f"{path} is not a save file.")
+        if version != VERSION:
+            raise SaveFormatError(f"{path} is save version {version}, expected {VERSION}.")
+
+        sections = _readSections(file)
+        meta = json.loads(_expect(sections, b"META"))
+        shape = meta["width"], meta["height"]
+
+        storageDir: Optional[str] = None
+        tag, payload = next(sections, (b"", b""))
+        if tag == b"STOR":
+            storageDir = payload.decode("utf-8")
+        else:
+            sections = itertools.chain([(tag, payload)], sections)
+            tiles = _layer(_expect(sections, b"TILE"), tileTypes.tileDt, shape)
+            visible = _layer(_expect(sections, b"VISI"), np.bool_, shape)
+            explored = _layer(_expect(sections, b"EXPL"), np.bool_, shape)
+        records = np.frombuffer(_expect(sections, b"ENTS"), dtype=ENTITY_DT)
+        paths = np.frombuffer(_expect(sections, b"PATH"), dtype=np.int32).reshape(-1, 2)
+
+    entities = _unpackEntities(records, paths, meta)
+
+    engine = Engine(player=entities[meta["player"]])
+    engine.turn = meta["turn"]
+    engine.depth = meta["depth"]
+
+    if storageDir is not None:
+        try:
+            gameMap = GameMap.open(engine, storageDir)
+        except (OSError, ValueError) as exc:
+            raise SaveFormatError(f"{path}'s map layers can't be opened: {exc}") from exc
+        if (gameMap.width, gameMap.height) != shape:
+            raise SaveFormatError(f"The map layers in {storageDir} aren't {shape[0]}x{shape[1]} as saved.")
+    else:
+        gameMap = GameMap(engine, *shape)
+        gameMap.tiles[...] = tiles
+        gameMap.visible[...] = visible
+        gameMap.explored[...] = explored
+        gameMap.markTilesDirty()
+    gameMap.scheduler.time = meta["time"]
+    for entity, container in zip(entities, records["container"].tolist()):
+        if container < 0:
+            entity.parent = gameMap
+            gameMap.addEntity(entity)
+        else:
+            inventory = entities[container].inventory
+            entity.parent = inventory
+            inventory.items.append(entity)
+    for entity, nextTurn in zip(entities, records["nextTurn"].tolist()):
+        if nextTurn >= 0:
+            gameMap.scheduler.schedule(entity, nextTurn)
+        elif nextTurn == PARKED:
+            gameMap.activity.sleep(entity)
+    engine.gameMap = gameMap
+
+    for text, fg, count in meta["messages"]:
+        message = Message(text, tuple(fg))
+        message.count = count
+        engine.messageLog.messages.append(message)
+
+    engine.eventHandler = HANDLER_CLASSES[meta["handler"]](engine)
+
+    levels: Optional[dict] = meta["levels"]
+    if levels is not None:
+        engine.levels = LevelPregenerator(
+            seed=levels["seed"], depth=pregenDepth, workers=pregenWorkers, **levels["options"],
+        )
+        engine.levels.prefetch(engine.depth + 1)
+
+    return engine
+
+
+def _packEntities(
+        entities: List[Entity],
+) -> Tuple[np.ndarray, np.ndarray, List[str], List[str], List[str]]:
+    records = np.zeros(len(entities), dtype=ENTITY_DT)
+    rows = np.array([entity._row for entity in entities], dtype=np.intp)
+
+    # Columns kept in the component store are gathered in bulk.
+    records["x"] = store.x[rows]
+    records["y"] = store.y[rows]
+    records["ch"] = store.ch[rows]
+    records["fg"] = store.fg[rows]
+    records["blocks"] = store.blocks[rows]
+    records["sight"] = store.sight[rows]
+    records["speed"] = store.speed[rows]
+    records["hp"] = store.hp[rows]
+    records["maxHP"] = store.maxHP[rows]
+    records["power"] = store.power[rows]
+    records["defence"] = store.defence[rows]
+
+    # The rest are collected into lists, then written a column at a time.
+    names: Dict[str, int] = {}
+    aiNames: Dict[str, int] = {}
+    consumeableNames: Dict[str, int] = {}
+    columns: Dict[str, list] = {
+        name: [] for name in (
+            "kind", "name", "renderOrder", "ai", "capacity",
+            "lastSeen", "pathStart", "pathEnd", "consumeable", "amount",
+        )
+    }
+    paths: List[Tuple[int, int]] = []
+
+    for entity in entities:
+        columns["name"].append(names.setdefault(entity.name, len(names)))
+        columns["renderOrder"].append(entity.renderOrder.value)
+
+        ai = getattr(entity, "ai", None)
+        lastSeen = getattr(ai, "lastSeen", None)
+        columns["lastSeen"].append(lastSeen or (-1, -1))
+        columns["pathStart"].append(len(paths))
+        paths.extend(getattr(ai, "path", ()))
+        columns["pathEnd"].append(len(paths))
+
+        if isinstance(entity, Actor):
+            columns["kind"].append(ACTOR)
+            columns["capacity"].append(entity.inventory.capacity)
+            columns["ai"].append(aiNames.setdefault(type(ai).__name__, len(aiNames)) if ai else -1)
+            columns["consumeable"].append(-1)
+            columns["amount"].append(0)
+        else:
+            consumeable = entity.consumeable
+            columns["kind"].append(ITEM)
+            columns["capacity"].append(0)
+            columns["ai"].append(-1)
+            columns["consumeable"].append(
+                consumeableNames.setdefault(type(consumeable).__name__, len(consumeableNames))
+            )
+            columns["amount"].append(getattr(consumeable, "amount", 0))
+
+    if entities:
+        for name, values in columns.items():
+            records[name] = values
+
+    return (
+        records,
+        np.array(paths, dtype=np.int32).reshape(-1, 2),
+        list(names),
+        list(aiNames),
+        list(consumeableNames),
+    )
+
+
+def _unpackEntities(records: np.ndarray, paths: np.ndarray, meta: dict) -> List[Entity]:
+    names = meta["names"]
+    aiClasses = [AI_CLASSES[name] for name in meta["aiClasses"]]
+    consumeableClasses = [CONSUMEABLE_CLASSES[name] for name in meta["consumeableClasses"]]
+    pathList = paths.tolist()
+
+    entities: List[Entity] = []
+    for kind, name, renderOrder, ai, capacity, lastSeen, pathStart, pathEnd, consumeable, amount in zip(
+            *(
+                records[column].tolist()
+                for column in (
+                    "kind", "name", "renderOrder", "ai", "capacity",
+                    "lastSeen", "pathStart", "pathEnd", "consumeable", "amount",
+                )
+            )
+    ):
+        if kind == ACTOR:
+            entity = Actor(
+                name=names[name],
+                aiCLS=aiClasses[ai] if ai >= 0 else BaseAI,
+                fighter=Fighter(hp=0, defence=0, power=0),
+                inventory=Inventory(capacity=capacity),
+            )
+            if ai < 0:
+                entity.ai = None
+            elif isinstance(entity.ai, HostileEnemy):
+                if lastSeen[0] >= 0:
+                    entity.ai.lastSeen = lastSeen[0], lastSeen[1]
+                entity.ai.path = [(x, y) for x, y in pathList[pathStart:pathEnd]]
+        else:
+            # Saved consumeables are rebuilt from their 'amount'.
+            entity = Item(
+                name=names[name],
+                consumeable=consumeableClasses[consumeable](amount),
+            )
+        entity.renderOrder = RenderOrder(renderOrder)
+        entities.append(entity)
+
+    # Columns kept in the component store are written in bulk.
+    rows = np.array([entity._row for entity in entities], dtype=np.intp)
+    store.x[rows] = records["x"]
+    store.y[rows] = records["y"]
+    store.ch[rows] = records["ch"]
+    store.fg[rows] = records["fg"]
+    store.blocks[rows] = records["blocks"]
+    store.sight[rows] = records["sight"]
+    store.speed[rows] = records["speed"]
+    store.hp[rows] = records["hp"]
+    store.maxHP[rows] = records["maxHP"]
+    store.power[rows] = records["power"]
+    store.defence[rows] = records["defence"]
+
+    return entities
+
+
+def _nextTurn(gameMap: GameMap, entity: Entity) -> int:
+    if not isinstance(entity, Actor):
+        return UNSCHEDULED
+    if gameMap.scheduler.isParked(entity):
+        return PARKED
+    nextTurn = gameMap.scheduler.nextTurn(entity)
+    return UNSCHEDULED if nextTurn is None else nextTurn
+
+
+def _writeSection(file: BinaryIO, tag: bytes, payload: bytes) -> None:
+    file.write(_sectionHeader.pack(tag, len(payload)))
+    file.write(payload)
+
+
+def _readSections(file: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield each section of a save file as it's read."""
+    while True:
+        header = file.read(_sectionHeader.size)
+        if not header:
+            return
+        if len(header) != _sectionHeader.size:
+            raise SaveFormatError("Save file is truncated.")
+        tag, length = _sectionHeader.unpack(header)
+        payload = file.read(length)
+        if len(payload) != length:
+            raise SaveFormatError("Save file is truncated.")
+        yield tag, payload
+
+
+def _expect(sections: Iterator[Tuple[bytes, bytes]], expected: bytes) -> bytes:
+    tag, payload = next(sections, (b"", b""))
+    if tag != expected:
+        raise SaveFormatError(f"Expected a {expected!r} section, found {tag!r}.")
+    return payload
+
+
+def _layer(payload: bytes, dtype: np.dtype, shape: Tuple[int, int]) -> np.ndarray:
+    return np.frombuffer(payload, dtype=dtype).reshape(shape, order="F")
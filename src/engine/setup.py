@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from src.engine.engine import Engine
+from src.engine.levelPregenerator import LevelPregenerator
+from src.entities import entityFactories
+from src.map.procgen import buildLevel, generateChunkedWorld
+from src.display import colours
+
+
+def newEngine(
+        *,
+        mapWidth: int,
+        mapHeight: int,
+        maxRooms: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        maxMonstersPerRoom: int,
+        maxItemsPerRoom: int,
+        storageDir: Optional[str] = None,
+        seed: Optional[int] = None,
+        pregenDepth: int = 0,
+        pregenWorkers: int = 0,
+) -> Engine:
+    """
+    Return a brand new Engine with a freshly generated dungeon and player.
+    If 'storageDir' is given the first map's tile layers are memory mapped files in it.
+    The dungeon's levels are generated from 'seed', or a random one if it's None.
+    'pregenDepth' levels below the current one are generated ahead of time
+    by 'pregenWorkers' processes, see LevelPregenerator.
+    """
+    player = entityFactories.player.create()
+    engine = Engine(player=player)
+
+    engine.levels = LevelPregenerator(
+        seed=seed,
+        depth=pregenDepth,
+        workers=pregenWorkers,
+        mapWidth=mapWidth,
+        mapHeight=mapHeight,
+        maxRooms=maxRooms,
+        minRoomSize=minRoomSize,
+        maxRoomSize=maxRoomSize,
+        maxMonstersPerRoom=maxMonstersPerRoom,
+        maxItemsPerRoom=maxItemsPerRoom,
+    )
+    engine.gameMap = buildLevel(engine, engine.levels.take(engine.depth), storageDir)
+    engine.levels.prefetch(engine.depth + 1)
+
+    return _welcome(engine)
+
+
+def newChunkedEngine(
+        *,
+        seed: int,
+        chunkSize: int,
+        mapWidth: int,
+        mapHeight: int,
+        viewWidth: int,
+        viewHeight: int,
+        maxRoomsPerChunk: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        maxMonstersPerRoom: int,
+        maxItemsPerRoom: int,
+) -> Engine:
+    """Return a brand new Engine in a chunked world, generated as the player explores it."""
+    player = entityFactories.player.create()
+    engine = Engine(player=player)
+
+    engine.gameMap = generateChunkedWorld(
+        seed=seed,
+        chunkSize=chunkSize,
+        maxRoomsPerChunk=maxRoomsPerChunk,
+        minRoomSize=minRoomSize,
+        maxRoomSize=maxRoomSize,
+        mapWidth=mapWidth,
+        mapHeight=mapHeight,
+        viewWidth=viewWidth,
+        viewHeight=viewHeight,
+        maxMonstersPerRoom=maxMonstersPerRoom,
+        maxItemsPerRoom=maxItemsPerRoom,
+        engine=engine,
+    )
+
+    return _welcome(engine)
+
+
+def _welcome(engine: Engine) -> Engine:
+    engine.updateFOV()
+
+    engine.messageLog.addMessage(
+        "Welcome to the dungeon! We've got fun and games!", colours.welcomeText
+    )
+
+    return engine
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import random
+import time
+from typing import Callable, Iterator, List, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+from src.engine.inputHandlers import MOVE_KEYS, WAIT_KEYS
+
+if TYPE_CHECKING:
+    from src.engine.engine import Engine
+    from src.engine.replay import Recorder
+
+# A policy is given the engine and returns the next key the "player" presses.
+Policy = Callable[["Engine"], int]
+
+# Keys which a random player chooses between. Pickup is included so that items get used up.
+RANDOM_KEYS = [*MOVE_KEYS, *WAIT_KEYS, tcod.event.KeySym.G]
+
+
+class RandomPolicy:
+    """Presses a random movement, wait or pickup key every step."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.random = random.Random(seed)
+
+    def __call__(self, engine: Engine) -> int:
+        return self.random.choice(RANDOM_KEYS)
+
+
+class ScriptedPolicy:
+    """Presses the given keys in order, looping back to the start when they run out."""
+
+    def __init__(self, keys: Sequence[int]):
+        if not keys:
+            raise ValueError("A scripted policy needs at least one key.")
+        self.keys = keys
+        self.index = 0
+
+    @classmethod
+    def fromString(cls, script: str) -> ScriptedPolicy:
+        """
+        Build a policy from a string of keys, e.g. "hhjjl.g".
+        Each character is the key which types it unshifted, so vi keys, '.' and
+        'g' all work. Raises ValueError for a character which isn't such a key,
+        e.g. an uppercase letter.
+        """
+        keys = []
+        for char in script:
+            key = tcod.event.KeySym(ord(char))
+            if key == tcod.event.KeySym.UNKNOWN:
+                raise ValueError(f"{char!r} in the script isn't a key, use lowercase letters and unshifted symbols.")
+            keys.append(key)
+        return cls(keys)
+
+    def __call__(self, engine: Engine) -> int:
+        key = self.keys[self.index]
+        self.index = (self.index + 1) % len(self.keys)
+        return key
+
+
+class SimulationReport:
+    """Timing and end state of a headless simulation run."""
+
+    def __init__(self, engine: Engine, steps: int, turns: int, latencies: List[float], elapsed: float):
+        self.engine = engine
+        self.steps = steps  # Key presses handled.
+        self.turns = turns  # Key presses which advanced a turn.
+        self.latencies = latencies  # Seconds taken to handle each step.
+        self.elapsed = elapsed
+
+    @property
+    def turnsPerSecond(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Return the q'th percentile step latency in seconds."""
+        if not self.latencies:
+            return 0.0
+        return float(np.percentile(self.latencies, q))
+
+    def summary(self) -> str:
+        player = self.engine.player
+        gameMap = self.engine.gameMap
+        return "\n".join(
+            [
+                f"Steps: {self.steps}, turns: {self.turns} in {self.elapsed:.3f}s "
+                f"({self.turnsPerSecond:.1f} turns/s)",
+                "Step latency: "
+                + ", ".join(
+                    f"p{q} {self.percentile(q) * 1000:.3f}ms" for q in (50, 90, 99)
+                )
+                + f", max {max(self.latencies, default=0.0) * 1000:.3f}ms",
+                f"Player: {'alive' if player.isAlive else 'dead'}, "
+                f"HP {player.fighter.hp}/{player.fighter.maxHP} at {player.x}, {player.y}",
+                f"Map: level {self.engine.depth}, {gameMap.width}x{gameMap.height}, {len(gameMap.entities)} entities, "
+                f"{sum(1 for _ in gameMap.actors)} living actors",
+                f"Messages: {len(self.engine.messageLog.messages)}",
+                f"Frames: {self.engine.frameScheduler.framesRendered} rendered, "
+                f"{self.engine.frameScheduler.framesSkipped} skipped",
+            ]
+        )
+
+
+def keyEvents(policy: Policy, engine: Engine) -> Iterator[tcod.event.KeyDown]:
+    """Yield the key presses chosen by a policy, as tcod events."""
+    while True:
+        yield tcod.event.KeyDown(scancode=0, sym=policy(engine), mod=tcod.event.Modifier.NONE)
+
+
+def runSimulation(
+        engine: Engine,
+        policy: Policy,
+        *,
+        steps: int,
+        console: Optional[tcod.Console] = None,
+        descendEvery: Optional[int] = None,
+        recorder: Optional[Recorder] = None,
+) -> SimulationReport:
+    """
+    Drive the engine with key presses from 'policy' as fast as possible.
+
+    Each key press is dispatched to the active event handler and its action
+    goes through EventHandler.handleAction, exactly as in the real game loop.
+    If 'console' is given then each step which changed the screen is also
+    rendered offscreen to it, as decided by the engine's frame scheduler.
+    If 'descendEvery' is given the player descends to the next level after
+    that many turns on each, with the time taken counted in that step.
+    If 'recorder' is given the key presses are recorded to it, to be replayed.
+    The run stops after 'steps' key presses, or when the player dies.
+    """
+    latencies: List[float] = []
+    turns = 0
+    clock = time.perf_counter
+
+    events = keyEvents(policy, engine)
+    start = clock()
+
+    for _ in range(steps):
+        if not engine.player.isAlive:
+            break
+
+        stepStart = clock()
+        event = next(events)
+        if recorder is not None:
+            recorder.record(event)
+        eventHandler = engine.eventHandler
+        if eventHandler.handleAction(eventHandler.dispatch(event)):
+            turns += 1
+            if descendEvery and turns % descendEvery == 0:
+                engine.descend()
+        if recorder is not None:
+            recorder.checkpoint()
+
+        if console is not None and engine.frameScheduler.beginFrame():
+            console.clear()
+            engine.eventHandler.onRender(console=console)
+            engine.frameScheduler.endFrame()
+
+        latencies.append(clock() - stepStart)
+
+    return SimulationReport(engine, len(latencies), turns, latencies, clock() - start)
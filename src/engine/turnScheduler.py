@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Optional, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.entities.entity import Actor
+
+# The speed of an ordinary actor, which gets one action per turn.
+NORMAL_SPEED = 100
+
+# Ticks of game time in one turn.
+TURN_TICKS = 100
+
+
+def actionDelay(speed: int) -> int:
+    """Return the ticks until an actor with 'speed' can act again."""
+    return max(1, TURN_TICKS * NORMAL_SPEED // max(1, speed))
+
+
+class TurnScheduler:
+    """
+    A priority queue of the actors on a GameMap, keyed on when each next acts.
+
+    Each turn the clock is advanced by the time the player's action took,
+    and only the actors due before then are popped, each to be rescheduled
+    after a delay depending on its speed. Ties go to the lowest component
+    store row, so actors with the same speed keep a stable order.
+
+    Actors which have nothing to do, e.g. sleeping ones, can be parked. A
+    parked actor is out of the queue, costing nothing per turn, until it's
+    woken. Removed entries are left in the heap and skipped when popped.
+    """
+
+    def __init__(self) -> None:
+        self.time = 0
+        self._heap: List[list] = []
+        self._entries: Dict[Actor, list] = {}  # The live heap entry of each scheduled actor.
+        self._parked: Set[Actor] = set()
+        self._counter = itertools.count()  # Separates entries for a reused row.
+        self._current: Optional[Actor] = None  # The actor 'advance' last yielded, until it's dealt with.
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self._entries
+
+    def schedule(self, actor: Actor, time: Optional[int] = None) -> None:
+        """Make 'actor' act at 'time', or as soon as possible if it's None."""
+        self._cancel(actor)
+        self._parked.discard(actor)
+        entry = [self.time if time is None else time, actor._row, next(self._counter), actor]
+        self._entries[actor] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, actor: Actor) -> None:
+        """Stop scheduling 'actor', e.g. because it has died or left the map."""
+        self._cancel(actor)
+        self._parked.discard(actor)
+
+    def park(self, actor: Actor) -> None:
+        """Take 'actor' out of the queue until it's woken."""
+        self._cancel(actor)
+        self._parked.add(actor)
+
+    def wake(self, actor: Actor) -> None:
+        """Schedule a parked actor to act as soon as possible. Does nothing if it isn't parked."""
+        if actor in self._parked:
+            self.schedule(actor)
+
+    def isParked(self, actor: Actor) -> bool:
+        return actor in self._parked
+
+    def nextTurn(self, actor: Actor) -> Optional[int]:
+        """Return when 'actor' next acts, or None if it isn't scheduled."""
+        entry = self._entries.get(actor)
+        return entry[0] if entry else None
+
+    def advance(self, ticks: int) -> Iterator[Actor]:
+        """
+        Move the clock forward by 'ticks' and yield each actor due to act before
+        the new time, in order. An actor is rescheduled once the caller is done
+        with it, unless it was removed, parked or rescheduled meanwhile. That's
+        also done if the caller raises, as the abandoned iterator is closed, so
+        an actor whose turn fails isn't left out of the queue.
+        """
+        self.time += ticks
+        heap = self._heap
+        while heap and heap[0][0] < self.time:
+            entry = heapq.heappop(heap)
+            actor = entry[-1]
+            if actor is None:
+                continue  # Cancelled.
+            del self._entries[actor]
+
+            self._current = actor
+            try:
+                yield actor
+            finally:
+                if self._current is actor:
+                    self.schedule(actor, entry[0] + actionDelay(actor.speed))
+
+    def _cancel(self, actor: Actor) -> None:
+        if self._current is actor:
+            self._current = None
+        entry = self._entries.pop(actor, None)
+        if entry is not None:
+            entry[-1] = None
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np  # type: ignore
+
+# Not on any GameMap.
+NO_MAP = -1
+
+# Columns copied when an entity is cloned. 'mapId' and 'owner' are excluded,
+# since a clone isn't on a map until it's added to one.
+CLONED_COLUMNS = ("x", "y", "ch", "fg", "blocks", "alive", "sight", "speed", "hp", "maxHP", "power", "defence")
+
+
+class ComponentStore:
+    """
+    Column storage for the per-instance state of entities and their fighters.
+
+    Every Entity owns one row, and its position, glyph, blocking flag, senses and
+    fighter stats are properties reading and writing that row. Keeping them in
+    NumPy arrays lets systems query every actor on a map at once instead
+    of walking Python objects one at a time.
+
+    Arrays are reallocated as the store grows, so never hold on to a column,
+    always look it up on the store.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = 0
+        self.size = 0  # One past the highest row ever allocated.
+        self._free: List[int] = []
+
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.ch = np.zeros(0, dtype=np.int32)  # Unicode codepoint.
+        self.fg = np.zeros((0, 3), dtype=np.uint8)
+        self.blocks = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+        self.sight = np.zeros(0, dtype=np.int32)  # How many tiles an actor can see, 0 if it can't.
+        self.speed = np.zeros(0, dtype=np.int32)  # How often an actor acts, see turnScheduler.
+        self.hp = np.zeros(0, dtype=np.int32)
+        self.maxHP = np.zeros(0, dtype=np.int32)
+        self.power = np.zeros(0, dtype=np.int32)
+        self.defence = np.zeros(0, dtype=np.int32)
+
+        # The id of the GameMap each row is on and a weak reference to the entity owning
+        # it while it's there. Weak, so the store doesn't keep abandoned maps alive.
+        self.mapId = np.zeros(0, dtype=np.int32)
+        self.owner = np.zeros(0, dtype=object)
+
+        self._grow(capacity)
+
+    def allocate(self) -> int:
+        """Return a cleared row for a new entity."""
+        if self._free:
+            return self._free.pop()
+
+        if self.size == self.capacity:
+            self._grow(self.capacity * 2)
+
+        row = self.size
+        self.size += 1
+        return row
+
+    def release(self, row: int) -> None:
+        """Clear a row and make it available for reuse."""
+        self._clear(row)
+        self._free.append(row)
+
+    def snapshot(self, row: int) -> Tuple:
+        """Return the values of the cloned columns for a row."""
+        return tuple(getattr(self, column)[row].tolist() for column in CLONED_COLUMNS)
+
+    def restore(self, row: int, values: Tuple) -> None:
+        """Write values returned by 'snapshot' into a row."""
+        for column, value in zip(CLONED_COLUMNS, values):
+            getattr(self, column)[row] = value
+
+    def rowsOnMap(self, mapId: int) -> np.ndarray:
+        """Return the rows of all entities on the given map."""
+        return np.flatnonzero(self.mapId[: self.size] == mapId)
+
+    def livingRowsOnMap(self, mapId: int) -> np.ndarray:
+        """Return the rows of the living actors on the given map."""
+        size = self.size
+        return np.flatnonzero((self.mapId[:size] == mapId) & self.alive[:size])
+
+    def _clear(self, row: int) -> None:
+        for column in CLONED_COLUMNS:
+            getattr(self, column)[row] = 0
+        self.mapId[row] = NO_MAP
+        self.owner[row] = None
+
+    def _grow(self, capacity: int) -> None:
+        for column in (*CLONED_COLUMNS, "mapId", "owner"):
+            old = getattr(self, column)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[: self.capacity] = old
+            setattr(self, column, new)
+        self.mapId[self.capacity:] = NO_MAP
+        self.owner[self.capacity:] = None
+        self.capacity = capacity
+
+
+# The store shared by every entity.
+store = ComponentStore()
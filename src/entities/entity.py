@@ -1,7 +1,9 @@
 from __future__ import annotations
-from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
+import functools
+from typing import Any, Dict, Optional, Tuple, Type, TYPE_CHECKING, Union
 from src.map.renderOrder import RenderOrder
-import copy
+from src.entities.componentStore import store
+from src.engine.turnScheduler import NORMAL_SPEED
 
 if TYPE_CHECKING:
     from src.components.ai import BaseAI
@@ -10,14 +12,16 @@ if TYPE_CHECKING:
     from src.components.inventory import Inventory
     from src.map.gameMap import GameMap
 
-T = TypeVar("T", bound="Entity")
-
 
 class Entity:
     """
     A generic object representing players, enemies, items, etc.
+
+    Position, glyph and blocking are kept in this entity's row of the component store.
     """
 
+    __slots__ = ("_row", "parent", "name", "renderOrder", "__weakref__")
+
     parent: Union[GameMap, Inventory]
 
     def __init__(
@@ -31,6 +35,7 @@ class Entity:
             blocksMovement: bool = False,
             renderOrder: RenderOrder = RenderOrder.CORPSE,
     ):
+        self._row = store.allocate()
         self.x = x
         self.y = y
         self.char = char
@@ -41,38 +46,98 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.addEntity(self)
+
+    def __del__(self) -> None:
+        if hasattr(self, "_row"):  # Possibly un-initialized.
+            store.release(self._row)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Copy this entity's row values instead of the row it's using."""
+        state = {name: getattr(self, name) for name in _slotNames(type(self)) if hasattr(self, name)}
+        state["_row"] = store.snapshot(self._row)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Give a copied entity a row of its own, holding the original's values."""
+        values = state.pop("_row")
+        self._row = store.allocate()
+        store.restore(self._row, values)
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def x(self) -> int:
+        return store.x.item(self._row)
+
+    @x.setter
+    def x(self, value: int) -> None:
+        store.x[self._row] = value
+
+    @property
+    def y(self) -> int:
+        return store.y.item(self._row)
+
+    @y.setter
+    def y(self, value: int) -> None:
+        store.y[self._row] = value
+
+    @property
+    def char(self) -> str:
+        return chr(store.ch.item(self._row))
+
+    @char.setter
+    def char(self, value: str) -> None:
+        store.ch[self._row] = ord(value)
+
+    @property
+    def colour(self) -> Tuple[int, int, int]:
+        return tuple(store.fg[self._row].tolist())
+
+    @colour.setter
+    def colour(self, value: Tuple[int, int, int]) -> None:
+        store.fg[self._row] = value
+
+    @property
+    def blocksMovement(self) -> bool:
+        return store.blocks.item(self._row)
+
+    @blocksMovement.setter
+    def blocksMovement(self, value: bool) -> None:
+        store.blocks[self._row] = value
 
     @property
     def gameMap(self) -> GameMap:
         return self.parent.gameMap
 
-    def spawn(self: T, gameMap: GameMap, x: int, y: int) -> T:
-        """Spawn a copy of this instance at the given location"""
-        clone = copy.deepcopy(self)
-        clone.x = x
-        clone.y = y
-        clone.parent = gameMap
-        gameMap.entities.add(clone)
-        return clone
-
     def place(self, x: int, y: int, gameMap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location. Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gameMap:
             if hasattr(self, "parent"):  # Possibly un-initialized.
                 if self.parent is self.gameMap:
-                    self.gameMap.entities.remove(self)
+                    self.gameMap.removeEntity(self)
+            self.x = x
+            self.y = y
             self.parent = gameMap
-            gameMap.entities.add(self)
+            gameMap.addEntity(self)
+        else:
+            self.relocate(x, y)
 
     def move(self, dx: int, dy: int) -> None:
-        self.x += dx
-        self.y += dy
+        self.relocate(self.x + dx, self.y + dy)
+
+    def relocate(self, x: int, y: int) -> None:
+        """Change this entity's location, keeping its GameMap's index up to date."""
+        oldX, oldY = self.x, self.y
+        self.x = x
+        self.y = y
+        if hasattr(self, "parent") and self.parent is self.gameMap:
+            self.gameMap.moveEntity(self, oldX, oldY)
 
 
 class Actor(Entity):
+    __slots__ = ("_ai", "fighter", "inventory")
+
     def __init__(
             self,
             *,
@@ -84,6 +149,8 @@ class Actor(Entity):
             aiCLS: Type[BaseAI],
             fighter: Fighter,
             inventory: Inventory,
+            sight: int = 8,
+            speed: int = NORMAL_SPEED,
     ):
         super().__init__(
             x=x,
@@ -95,14 +162,43 @@ class Actor(Entity):
             renderOrder=RenderOrder.ACTOR,
         )
 
-        self.ai: Optional[BaseAI] = aiCLS(self)
+        self.ai = aiCLS(self)
+        self.sight = sight
+        self.speed = speed
 
         self.fighter = fighter
-        self.fighter.parent = self
+        self.fighter.attach(self)
 
         self.inventory = inventory
         self.inventory.parent = self
 
+    @property
+    def ai(self) -> Optional[BaseAI]:
+        return self._ai
+
+    @ai.setter
+    def ai(self, value: Optional[BaseAI]) -> None:
+        self._ai = value
+        store.alive[self._row] = value is not None
+
+    @property
+    def sight(self) -> int:
+        """How many tiles away this actor can see."""
+        return store.sight.item(self._row)
+
+    @sight.setter
+    def sight(self, value: int) -> None:
+        store.sight[self._row] = value
+
+    @property
+    def speed(self) -> int:
+        """How often this actor acts, NORMAL_SPEED being once a turn."""
+        return store.speed.item(self._row)
+
+    @speed.setter
+    def speed(self, value: int) -> None:
+        store.speed[self._row] = value
+
     @property
     def isAlive(self) -> bool:
         """Returns True as long as thie actor can perform actions."""
@@ -110,6 +206,8 @@ class Actor(Entity):
 
 
 class Item(Entity):
+    __slots__ = ("consumeable",)
+
     def __init__(
             self,
             *,
@@ -132,3 +230,14 @@ class Item(Entity):
 
         self.consumeable = consumeable
         self.consumeable.parent = self
+
+
+@functools.lru_cache(maxsize=None)
+def _slotNames(cls: type) -> Tuple[str, ...]:
+    """Return the names of every slot of 'cls' holding state, including inherited ones."""
+    return tuple(
+        name
+        for klass in reversed(cls.__mro__)
+        for name in klass.__dict__.get("__slots__", ())
+        if name != "__weakref__"
+    )
@@ -1,39 +1,51 @@
+import functools
+
 from src.components.ai import HostileEnemy
 from src.components.consumeable import HealingConsumeable
-from src.components.fighter import Fighter
-from src.components.inventory import Inventory
-from src.entities.entity import Actor, Item
+from src.entities.prototypes import ActorPrototype, ItemPrototype
 
-player = Actor(
+player = ActorPrototype(
     char="@",
     colour=(255, 255, 255),
     name="Player",
     aiCLS=HostileEnemy,
-    fighter=Fighter(hp=30, defence=2, power=5),
-    inventory=Inventory(capacity=26),
+    hp=30,
+    defence=2,
+    power=5,
+    capacity=26,
+    sight=8,
+    speed=100,
 )
 
-orc = Actor(
+orc = ActorPrototype(
     char="o",
     colour=(63, 127, 63),
     name="Orc",
     aiCLS=HostileEnemy,
-    fighter=Fighter(hp=10, defence=0, power=3),
-    inventory=Inventory(capacity=0),
+    hp=10,
+    defence=0,
+    power=3,
+    capacity=0,
+    sight=8,
+    speed=100,
 )
 
-troll = Actor(
+troll = ActorPrototype(
     char="T",
     colour=(0, 127, 0),
     name="Troll",
     aiCLS=HostileEnemy,
-    fighter=Fighter(hp=16, defence=1, power=4),
-    inventory=Inventory(capacity=0)
+    hp=16,
+    defence=1,
+    power=4,
+    capacity=0,
+    sight=8,
+    speed=100,
 )
 
-healthPotion = Item(
+healthPotion = ItemPrototype(
     char="!",
     colour=(127, 0, 255),
     name="Health Potion",
-    consumeable=HealingConsumeable(amount=4),
+    consumeable=functools.partial(HealingConsumeable, amount=4),
 )
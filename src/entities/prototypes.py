@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import Callable, Generic, Iterable, List, Tuple, Type, TypeVar, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from src.components.fighter import Fighter
+from src.components.inventory import Inventory
+from src.entities.componentStore import store
+from src.entities.entity import Actor, Entity, Item
+
+if TYPE_CHECKING:
+    from src.components.ai import BaseAI
+    from src.components.consumeable import Consumeable
+    from src.map.gameMap import GameMap
+
+T = TypeVar("T", bound=Entity)
+
+
+class Prototype(Generic[T]):
+    """
+    The template for a kind of entity, e.g. an orc.
+
+    Holds the data shared by every instance once, and builds new instances
+    holding only their own mutable state, rather than copying a template
+    entity and everything it references.
+    """
+
+    def create(self, x: int = 0, y: int = 0) -> T:
+        """Return a new instance which isn't on any map."""
+        raise NotImplementedError()
+
+    def spawn(self, gameMap: GameMap, x: int, y: int) -> T:
+        """Create an instance and add it to 'gameMap' at x, y."""
+        entity = self.create(x, y)
+        entity.parent = gameMap
+        gameMap.addEntity(entity)
+        return entity
+
+    def spawnMany(self, gameMap: GameMap, positions: Iterable[Tuple[int, int]]) -> List[T]:
+        """Create an instance at each x, y in 'positions' and add them all to 'gameMap'."""
+        positions = np.asarray(list(positions), dtype=np.int32).reshape(-1, 2)
+        entities = [self.create() for _ in range(len(positions))]
+
+        rows = np.array([entity._row for entity in entities], dtype=np.intp)
+        store.x[rows] = positions[:, 0]
+        store.y[rows] = positions[:, 1]
+
+        for entity in entities:
+            entity.parent = gameMap
+        gameMap.addEntities(entities)
+        return entities
+
+
+class ActorPrototype(Prototype[Actor]):
+    def __init__(
+            self,
+            *,
+            char: str,
+            colour: Tuple[int, int, int],
+            name: str,
+            aiCLS: Type[BaseAI],
+            hp: int,
+            defence: int,
+            power: int,
+            capacity: int,
+            sight: int,
+            speed: int,
+    ):
+        self.char = char
+        self.colour = colour
+        self.name = name
+        self.aiCLS = aiCLS
+        self.hp, self.defence, self.power = hp, defence, power
+        self.capacity = capacity
+        self.sight = sight
+        self.speed = speed
+
+    def create(self, x: int = 0, y: int = 0) -> Actor:
+        return Actor(
+            x=x,
+            y=y,
+            char=self.char,
+            colour=self.colour,
+            name=self.name,
+            aiCLS=self.aiCLS,
+            fighter=Fighter(hp=self.hp, defence=self.defence, power=self.power),
+            inventory=Inventory(capacity=self.capacity),
+            sight=self.sight,
+            speed=self.speed,
+        )
+
+
+class ItemPrototype(Prototype[Item]):
+    def __init__(
+            self,
+            *,
+            char: str,
+            colour: Tuple[int, int, int],
+            name: str,
+            consumeable: Callable[[], Consumeable],
+    ):
+        self.char = char
+        self.colour = colour
+        self.name = name
+        self.consumeable = consumeable  # Called to build each instance's component.
+
+    def create(self, x: int = 0, y: int = 0) -> Item:
+        return Item(
+            x=x,
+            y=y,
+            char=self.char,
+            colour=self.colour,
+            name=self.name,
+            consumeable=self.consumeable(),
+        )
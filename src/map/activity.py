@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from src.engine.profiler import profiler
+from src.engine.turnScheduler import actionDelay
+
+if TYPE_CHECKING:
+    from src.entities.entity import Actor
+    from src.map.gameMap import GameMap
+
+# Width and height in tiles of the regions dormant actors are filed under.
+REGION_SIZE = 16
+
+# How far from the player, in tiles (Chebyshev distance), actors stay awake.
+ACTIVE_RADIUS = 24
+
+
+class Activity:
+    """
+    Decides which actors on a GameMap are simulated and which lie dormant.
+
+    An actor whose turn comes up while it's further than 'radius' from the
+    player, and out of the player's FOV, is parked in the map's scheduler
+    instead of acting, so it costs nothing until it's woken. Dormant actors
+    are filed by the region they're in. Each turn only the regions around
+    the player and their FOV are looked at, so the cost of a turn depends
+    on how crowded the player's surroundings are rather than on the size of
+    the map's population. Noise wakes dormant actors in the same way.
+
+    A woken actor's AI is given the number of turns it slept through, so it
+    can catch up cheaply, e.g. by skipping along its path.
+
+    'radius' should be at least the longest sight of any actor, or actors
+    could fall asleep while they can see the player. None keeps every actor
+    awake.
+    """
+
+    def __init__(self, gameMap: GameMap, radius: Optional[int] = ACTIVE_RADIUS):
+        self.gameMap = gameMap
+        self.radius = radius
+        # Dormant actors by region. Dicts rather than sets, so they're woken in a repeatable order.
+        self._regions: Dict[Tuple[int, int], Dict[Actor, None]] = {}
+        # The region each dormant actor is filed under and when it went dormant.
+        self._dormant: Dict[Actor, Tuple[Tuple[int, int], int]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of dormant actors."""
+        return len(self._dormant)
+
+    def isDormant(self, actor: Actor) -> bool:
+        return actor in self._dormant
+
+    def sleepIfDistant(self, actor: Actor) -> bool:
+        """
+        Make 'actor' dormant and return True if it's too far from the player
+        to be worth simulating. Called when its turn comes up.
+        """
+        if self.radius is None:
+            return False
+        player = self.gameMap.engine.player
+        x, y = actor.x, actor.y
+        if max(abs(x - player.x), abs(y - player.y)) <= self.radius or self.gameMap.visible[x, y]:
+            return False
+        self.sleep(actor)
+        return True
+
+    def sleep(self, actor: Actor) -> None:
+        """Make 'actor' dormant until something wakes it."""
+        scheduler = self.gameMap.scheduler
+        scheduler.park(actor)
+        region = actor.x // REGION_SIZE, actor.y // REGION_SIZE
+        self._regions.setdefault(region, {})[actor] = None
+        self._dormant[actor] = region, scheduler.time
+        if profiler.enabled:
+            profiler.count("Activity.sleeps")
+
+    def wake(self, actor: Actor) -> None:
+        """Schedule a dormant actor again, letting its AI catch up on the turns it missed."""
+        entry = self._forget(actor)
+        if entry is None:
+            return
+        scheduler = self.gameMap.scheduler
+        scheduler.wake(actor)
+        if profiler.enabled:
+            profiler.count("Activity.wakes")
+
+        turns = (scheduler.time - entry[1]) // actionDelay(actor.speed)
+        if turns > 0 and actor.ai:
+            actor.ai.catchUp(turns)
+
+    def remove(self, actor: Actor) -> None:
+        """Forget a dormant actor, e.g. because it has left the map."""
+        self._forget(actor)
+
+    def _forget(self, actor: Actor) -> Optional[Tuple[Tuple[int, int], int]]:
+        entry = self._dormant.pop(actor, None)
+        if entry is not None:
+            actors = self._regions[entry[0]]
+            del actors[actor]
+            if not actors:
+                del self._regions[entry[0]]
+        return entry
+
+    def wakeAroundPlayer(self) -> None:
+        """Wake the dormant actors near the player or in their FOV. Called at the start of each turn."""
+        if not self._dormant:
+            return
+        player = self.gameMap.engine.player
+        visible = self.gameMap.visible
+
+        if self.radius is None:
+            windows = [(slice(0, self.gameMap.width), slice(0, self.gameMap.height))]
+        else:
+            windows = [self._window(player.x, player.y, self.radius)]
+        if self.gameMap.fovWindow:
+            windows.append(self.gameMap.fovWindow)
+
+        for actor in self._actorsInWindows(windows):
+            near = self.radius is None or max(abs(actor.x - player.x), abs(actor.y - player.y)) <= self.radius
+            if near or visible[actor.x, actor.y]:
+                self.wake(actor)
+
+    def noise(self, x: int, y: int, radius: int) -> None:
+        """Wake the dormant actors within 'radius' tiles of a noise at x, y."""
+        if not self._dormant:
+            return
+        for actor in self._actorsInWindows([self._window(x, y, radius)]):
+            if max(abs(actor.x - x), abs(actor.y - y)) <= radius:
+                self.wake(actor)
+
+    @staticmethod
+    def _window(x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        return slice(x - radius, x + radius + 1), slice(y - radius, y + radius + 1)
+
+    def _actorsInWindows(self, windows: List[Tuple[slice, slice]]) -> Iterator[Actor]:
+        """Yield the dormant actors filed under the regions overlapping any of 'windows'."""
+        regions: Set[Tuple[int, int]] = set()
+        for xSlice, ySlice in windows:
+            left, right = max(0, xSlice.start), min(self.gameMap.width, xSlice.stop) - 1
+            top, bottom = max(0, ySlice.start), min(self.gameMap.height, ySlice.stop) - 1
+            for regionX in range(left // REGION_SIZE, right // REGION_SIZE + 1):
+                for regionY in range(top // REGION_SIZE, bottom // REGION_SIZE + 1):
+                    regions.add((regionX, regionY))
+
+        for region in sorted(regions):
+            # Copied, since waking an actor removes it from its region.
+            yield from list(self._regions.get(region, ()))
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple, TYPE_CHECKING, Union
+
+import numpy as np  # type: ignore
+from tcod.console import Console
+
+from src.map import tileTypes
+from src.map.costGrid import CostGrid
+from src.map.gameMap import GameMap
+from src.map.spatialIndex import SpatialIndex
+
+if TYPE_CHECKING:
+    from src.engine.engine import Engine
+    from src.entities.entity import Entity
+
+Index = Union[Tuple[int, int], Tuple[slice, slice], Tuple[np.ndarray, np.ndarray]]
+
+
+class ChunkedLayer:
+    """
+    A 2D array split into square chunks which are only allocated when used.
+
+    Supports the indexing GameMap's arrays are used with: single tiles
+    '[x, y]', rectangular windows '[x1:x2, y1:y2]' (returned as a new dense
+    array), gathering '[xs, ys]' with index arrays, and field access
+    '["walkable"]' for structured layers.
+
+    A missing chunk is created filled with 'fill', then handed to 'generate'
+    if given. Reading a missing chunk of a layer without a generator returns
+    the fill value without allocating anything.
+    """
+
+    def __init__(
+            self,
+            width: int,
+            height: int,
+            chunkSize: int,
+            fill: np.ndarray,
+            generate: Optional[Callable[[int, int], None]] = None,
+    ):
+        self.width, self.height = width, height
+        self.chunkSize = chunkSize
+        self.fill = np.asarray(fill)
+        self.dtype = self.fill.dtype
+        self.generate = generate
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def chunk(self, chunkX: int, chunkY: int) -> np.ndarray:
+        """Return a chunk, creating and generating it first if needed."""
+        try:
+            return self.chunks[chunkX, chunkY]
+        except KeyError:
+            pass
+
+        chunk = np.full((self.chunkSize, self.chunkSize), self.fill, dtype=self.dtype, order="F")
+        # Added before generating, so that the generator can write to it through this layer.
+        self.chunks[chunkX, chunkY] = chunk
+        if self.generate:
+            self.generate(chunkX, chunkY)
+        return chunk
+
+    def evict(self, chunkX: int, chunkY: int) -> None:
+        self.chunks.pop((chunkX, chunkY), None)
+
+    def __getitem__(self, key: Union[str, Index]):
+        if isinstance(key, str):
+            return ChunkedField(self, key)
+
+        x, y = key
+        if isinstance(x, slice):
+            return self._getWindow(x, y)
+        if isinstance(x, np.ndarray):
+            return self._gather(x, y)
+
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f"{x}, {y} is out of bounds for a {self.width}x{self.height} layer.")
+        size = self.chunkSize
+        chunk = self._peek(x // size, y // size)
+        if chunk is None:
+            return self.fill[()]
+        return chunk[x % size, y % size]
+
+    def __setitem__(self, key: Index, value) -> None:
+        x, y = key
+        if not isinstance(x, slice):
+            size = self.chunkSize
+            self.chunk(x // size, y // size)[x % size, y % size] = value
+            return
+
+        value = np.asarray(value)
+        for chunk, chunkIndex, windowIndex in self._chunksInWindow(x, y, create=True):
+            chunk[chunkIndex] = value if value.ndim == 0 else value[windowIndex]
+
+    def _peek(self, chunkX: int, chunkY: int) -> Optional[np.ndarray]:
+        """Return a chunk for reading, or None if it's missing and would only hold the fill value."""
+        if self.generate:
+            return self.chunk(chunkX, chunkY)
+        return self.chunks.get((chunkX, chunkY))
+
+    def _getWindow(self, xSlice: slice, ySlice: slice) -> np.ndarray:
+        x1, x2, _ = xSlice.indices(self.width)
+        y1, y2, _ = ySlice.indices(self.height)
+        window = np.full((max(0, x2 - x1), max(0, y2 - y1)), self.fill, dtype=self.dtype, order="F")
+        for chunk, chunkIndex, windowIndex in self._chunksInWindow(xSlice, ySlice, create=False):
+            window[windowIndex] = chunk[chunkIndex]
+        return window
+
+    def _chunksInWindow(self, xSlice: slice, ySlice: slice, create: bool):
+        """Yield each chunk overlapping a window, with the overlap as indexes into the chunk and window."""
+        x1, x2, _ = xSlice.indices(self.width)
+        y1, y2, _ = ySlice.indices(self.height)
+        size = self.chunkSize
+
+        for chunkX in range(x1 // size, (x2 - 1) // size + 1):
+            for chunkY in range(y1 // size, (y2 - 1) // size + 1):
+                chunk = self.chunk(chunkX, chunkY) if create else self._peek(chunkX, chunkY)
+                if chunk is None:
+                    continue
+                left, top = chunkX * size, chunkY * size
+                overlapX1, overlapX2 = max(x1, left), min(x2, left + size)
+                overlapY1, overlapY2 = max(y1, top), min(y2, top + size)
+                yield (
+                    chunk,
+                    (slice(overlapX1 - left, overlapX2 - left), slice(overlapY1 - top, overlapY2 - top)),
+                    (slice(overlapX1 - x1, overlapX2 - x1), slice(overlapY1 - y1, overlapY2 - y1)),
+                )
+
+    def _gather(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        result = np.full(xs.shape, self.fill, dtype=self.dtype)
+        size = self.chunkSize
+        chunkXs, chunkYs = xs // size, ys // size
+        for chunkX, chunkY in set(zip(chunkXs.tolist(), chunkYs.tolist())):
+            chunk = self._peek(chunkX, chunkY)
+            if chunk is None:
+                continue
+            inChunk = (chunkXs == chunkX) & (chunkYs == chunkY)
+            result[inChunk] = chunk[xs[inChunk] % size, ys[inChunk] % size]
+        return result
+
+
+class ChunkedField:
+    """A read only view of one field of a structured ChunkedLayer, e.g. 'tiles["walkable"]'."""
+
+    def __init__(self, layer: ChunkedLayer, name: str):
+        self.layer = layer
+        self.name = name
+
+    def __getitem__(self, key: Index):
+        return self.layer[key][self.name]
+
+
+class ChunkedGameMap(GameMap):
+    """
+    A GameMap for worlds far larger than the screen.
+
+    'tiles', 'visible' and 'explored' are ChunkedLayers. Tiles are generated
+    a chunk at a time by 'generateChunk' the first time anything reads or
+    writes them, so only the chunks around where the player has been are
+    ever allocated. 'generateChunk' must be deterministic for a chunk and
+    only write inside it, as chunks far from the player are evicted and
+    regenerated if the player comes back. The explored state of an evicted
+    chunk is kept, packed to a bit per tile.
+
+    Pathfinding, FOV and rendering work on windows around the player:
+    'viewWidth' by 'viewHeight' tiles are drawn, centred on the player.
+    """
+
+    def __init__(
+            self,
+            engine: Engine,
+            width: int,
+            height: int,
+            *,
+            chunkSize: int,
+            generateChunk: Callable[[ChunkedGameMap, int, int], None],
+            viewWidth: int,
+            viewHeight: int,
+            keepRadius: int = 2,
+            entities: Iterable[Entity] = (),
+    ):
+        if width % chunkSize or height % chunkSize:
+            raise ValueError(f"Map size {width}x{height} must be a multiple of the chunk size {chunkSize}.")
+
+        self.chunkSize = chunkSize
+        self.generateChunk = generateChunk
+        self.viewWidth, self.viewHeight = viewWidth, viewHeight
+        self.keepRadius = keepRadius  # Chunks further than this from the player's chunk are evicted.
+
+        # Chunks which have ever been generated, and so have already had their entities placed.
+        self.populatedChunks: Set[Tuple[int, int]] = set()
+        self._packedExplored: Dict[Tuple[int, int], np.ndarray] = {}
+        self._cameraOrigin = 0, 0
+
+        super().__init__(engine, width, height, entities)
+        self._fovWindow = None  # Nothing is visible yet, and clearing the whole map would generate it.
+
+    def _newLayers(self) -> None:
+        width, height, size = self.width, self.height, self.chunkSize
+        self.spatialIndex = SpatialIndex(
+            width, height, blocking=ChunkedLayer(width, height, size, np.int16(0))
+        )
+        self.tiles = ChunkedLayer(width, height, size, tileTypes.wall, generate=self._generate)
+        self.visible = ChunkedLayer(width, height, size, np.bool_(False))
+        self.explored = ChunkedLayer(width, height, size, np.bool_(False), generate=self._restoreExplored)
+        # Only covers the area around the player, moved by 'recentre'.
+        self.costGrid = CostGrid(self, 0, 0, min(width, size * 2), min(height, size * 2))
+
+    def _markViewChanged(self, window: Optional[Tuple[slice, slice]]) -> None:
+        pass  # Chunked maps draw their viewport without a render cache.
+
+    def _generate(self, chunkX: int, chunkY: int) -> None:
+        self.generateChunk(self, chunkX, chunkY)
+        self.populatedChunks.add((chunkX, chunkY))
+        self.costGrid.markTerrainDirty()
+
+    def _restoreExplored(self, chunkX: int, chunkY: int) -> None:
+        packed = self._packedExplored.pop((chunkX, chunkY), None)
+        if packed is not None:
+            size = self.chunkSize
+            self.explored.chunks[chunkX, chunkY][...] = (
+                np.unpackbits(packed)[: size * size].reshape((size, size), order="F").astype(bool)
+            )
+
+    def evictDistantChunks(self, x: int, y: int) -> None:
+        """Drop the chunks further than 'keepRadius' chunks away from the chunk holding x, y."""
+        size = self.chunkSize
+        centreX, centreY = x // size, y // size
+
+        for chunkX, chunkY in list(self.tiles.chunks):
+            if max(abs(chunkX - centreX), abs(chunkY - centreY)) <= self.keepRadius:
+                continue
+
+            explored = self.explored.chunks.pop((chunkX, chunkY), None)
+            if explored is not None and explored.any():
+                self._packedExplored[chunkX, chunkY] = np.packbits(explored.ravel(order="F"))
+            self.tiles.evict(chunkX, chunkY)
+            self.visible.evict(chunkX, chunkY)
+
+    def recentre(self, x: int, y: int) -> None:
+        """Move the pathfinding window if x, y has got close to its edge."""
+        grid = self.costGrid
+        margin = self.chunkSize // 2
+        if (
+                grid.x + margin <= x < grid.x + grid.width - margin
+                and grid.y + margin <= y < grid.y + grid.height - margin
+        ):
+            return
+
+        gridX = max(0, min(x - grid.width // 2, self.width - grid.width))
+        gridY = max(0, min(y - grid.height // 2, self.height - grid.height))
+        if (gridX, gridY) != (grid.x, grid.y):
+            self.costGrid = CostGrid(self, gridX, gridY, grid.width, grid.height)
+
+    def updateFOV(self, x: int, y: int, radius: int) -> None:
+        """Keep the chunks and pathfinding window around x, y, then see GameMap.updateFOV."""
+        self.recentre(x, y)
+        self.evictDistantChunks(x, y)
+        super().updateFOV(x, y, radius)
+
+    @property
+    def cameraOrigin(self) -> Tuple[int, int]:
+        return self._cameraOrigin
+
+    def render(self, console: Console) -> None:
+        """Renders the part of the map around the player, see GameMap.render."""
+        player = self.engine.player
+        left = max(0, min(player.x - self.viewWidth // 2, self.width - self.viewWidth))
+        top = max(0, min(player.y - self.viewHeight // 2, self.height - self.viewHeight))
+        self._cameraOrigin = left, top
+        window = slice(left, left + self.viewWidth), slice(top, top + self.viewHeight)
+
+        tiles = self.tiles[window]
+        visible = self.visible[window]
+        # The window is clipped to the map, which may be smaller than the view.
+        width, height = tiles.shape
+        console.tiles_rgb[0:width, 0:height] = np.select(
+            condlist=[visible, self.explored[window]],
+            choicelist=[tiles["light"], tiles["dark"]],
+            default=tileTypes.SHROUD
+        )
+
+        self.renderEntities(console, left, top, self.viewWidth, self.viewHeight)
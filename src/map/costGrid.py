@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from src.map.gameMap import GameMap
+
+# Added to the cost of a tile for each blocking entity on it.
+# A lower number means more enemies will crowd behind each other
+# in hallways. A higher number means enemies will take longer paths
+# in order to surround the player.
+BLOCKER_PENALTY = 10
+
+
+class CostGrid:
+    """
+    The pathfinding cost of each tile on a GameMap, kept up to date in place.
+
+    The cost is the terrain cost (1 for walkable tiles, 0 for impassable ones)
+    plus a penalty for every blocking entity standing on a walkable tile.
+    The terrain part is only recomputed after the map's tiles are marked as
+    changed, while the penalty is adjusted as blocking entities come and go.
+    Because the array is never reallocated, the graph and pathfinder built
+    over it are created once and reused by every pathfinding call.
+
+    A grid covers the whole map by default. It can instead cover a window
+    of 'width' by 'height' tiles starting at 'x', 'y', in which case array
+    indexes are relative to that corner and tiles outside it are ignored.
+    """
+
+    def __init__(
+            self,
+            gameMap: GameMap,
+            x: int = 0,
+            y: int = 0,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+    ):
+        self.gameMap = gameMap
+        self.x, self.y = x, y
+        self.width = gameMap.width if width is None else width
+        self.height = gameMap.height if height is None else height
+        self.cost = np.zeros((self.width, self.height), dtype=np.int16, order="F")
+        self.graph = tcod.path.SimpleGraph(cost=self.cost, cardinal=2, diagonal=3)
+        self._pathfinder: Optional[tcod.path.Pathfinder] = None
+        self._terrainDirty = True
+
+    @property
+    def window(self) -> Tuple[slice, slice]:
+        """Return the area of the map covered by this grid as a 2D array index."""
+        return slice(self.x, self.x + self.width), slice(self.y, self.y + self.height)
+
+    def contains(self, x: int, y: int) -> bool:
+        """Return True if the map position x, y is covered by this grid."""
+        return 0 <= x - self.x < self.width and 0 <= y - self.y < self.height
+
+    def markTerrainDirty(self) -> None:
+        """Recompute the terrain cost the next time the grid is used."""
+        self._terrainDirty = True
+
+    def refresh(self) -> None:
+        """Rebuild the whole grid if the terrain has changed since it was last built."""
+        if not self._terrainDirty:
+            return
+
+        window = self.window
+        walkable = self.gameMap.tiles["walkable"][window]
+        blocking = self.gameMap.spatialIndex.blocking[window]
+        self.cost[...] = walkable
+        self.cost += np.where(walkable, blocking * BLOCKER_PENALTY, 0)
+        self._terrainDirty = False
+
+    def addBlocker(self, x: int, y: int) -> None:
+        if not self._terrainDirty and self.contains(x, y) and self.cost[x - self.x, y - self.y]:
+            self.cost[x - self.x, y - self.y] += BLOCKER_PENALTY
+
+    def removeBlocker(self, x: int, y: int) -> None:
+        if not self._terrainDirty and self.contains(x, y) and self.cost[x - self.x, y - self.y]:
+            self.cost[x - self.x, y - self.y] -= BLOCKER_PENALTY
+
+    def addBlockers(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Add a blocker at each x, y, like calling 'addBlocker' for each."""
+        if self._terrainDirty:
+            return
+        gridXs, gridYs = xs - self.x, ys - self.y
+        inside = (0 <= gridXs) & (gridXs < self.width) & (0 <= gridYs) & (gridYs < self.height)
+        gridXs, gridYs = gridXs[inside], gridYs[inside]
+        walkable = self.cost[gridXs, gridYs] != 0
+        np.add.at(self.cost, (gridXs[walkable], gridYs[walkable]), BLOCKER_PENALTY)
+
+    def pathfinder(self) -> tcod.path.Pathfinder:
+        """
+        Return a cleared pathfinder over this grid, ready for new roots.
+        The pathfinder works in this grid's coordinates, not the map's.
+        """
+        self.refresh()
+        if self._pathfinder is None:
+            self._pathfinder = tcod.path.Pathfinder(self.graph)
+        else:
+            self._pathfinder.clear()
+        return self._pathfinder
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from src.map.gameMap import GameMap
+
+# Distance given to tiles which can't reach any root.
+UNREACHABLE = np.iinfo(np.int32).max
+
+# Offsets to the 8 neighbours of a tile, cardinals first so that they win ties.
+NEIGHBOURS = (
+    (0, -1), (0, 1), (-1, 0), (1, 0),
+    (-1, -1), (1, -1), (-1, 1), (1, 1),
+)
+
+
+class FlowField:
+    """
+    A Dijkstra distance map rooted at one or more goal tiles.
+
+    A single FlowField can be shared by every actor heading for the same
+    goal. Actors approach the goal by stepping downhill and flee from it
+    by stepping uphill, each step only looking at the 8 neighbouring tiles.
+
+    The field covers the same area as the map's cost grid, or if 'radius' is
+    given only the tiles of it within 'radius' of the roots, so that its cost
+    doesn't grow with the size of the map. Tiles outside of the field are
+    treated as unreachable.
+    """
+
+    def __init__(self, gameMap: GameMap, roots: Iterable[Tuple[int, int]], radius: Optional[int] = None):
+        self.gameMap = gameMap
+
+        cost = gameMap.pathCost()
+        grid = gameMap.costGrid
+        # Roots in grid coordinates.
+        inside: List[Tuple[int, int]] = [(x - grid.x, y - grid.y) for x, y in roots if grid.contains(x, y)]
+
+        left, top, right, bottom = 0, 0, grid.width, grid.height
+        if radius is not None:
+            if inside:
+                xs, ys = [x for x, _ in inside], [y for _, y in inside]
+                left, top = max(0, min(xs) - radius), max(0, min(ys) - radius)
+                right, bottom = min(grid.width, max(xs) + radius + 1), min(grid.height, max(ys) + radius + 1)
+            else:
+                right = bottom = 0  # Nothing can reach a root, so there's nothing to cover.
+        cost = cost[left:right, top:bottom]
+        self.x, self.y = grid.x + left, grid.y + top
+
+        self.distance = np.full(cost.shape, UNREACHABLE, dtype=np.int32, order="F")
+        for x, y in inside:
+            self.distance[x - left, y - top] = 0
+
+        tcod.path.dijkstra2d(self.distance, cost, cardinal=2, diagonal=3, out=self.distance)
+
+    def distanceAt(self, x: int, y: int) -> int:
+        """Return the distance from x, y to the nearest root, or UNREACHABLE."""
+        x, y = x - self.x, y - self.y
+        if 0 <= x < self.distance.shape[0] and 0 <= y < self.distance.shape[1]:
+            return self.distance[x, y]
+        return UNREACHABLE
+
+    def descend(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """
+        Return the free neighbouring tile closest to the roots.
+        If no free neighbour is closer than x, y then returns None.
+        """
+        return self._step(x, y, downhill=True)
+
+    def ascend(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """
+        Return the free neighbouring tile furthest from the roots.
+        If no free neighbour is further than x, y then returns None.
+        """
+        return self._step(x, y, downhill=False)
+
+    def _step(self, x: int, y: int, downhill: bool) -> Optional[Tuple[int, int]]:
+        gameMap = self.gameMap
+        walkable = gameMap.tiles["walkable"]
+        blocking = gameMap.spatialIndex.blocking
+
+        best: Optional[Tuple[int, int]] = None
+        bestDistance = self.distanceAt(x, y)
+
+        for dx, dy in NEIGHBOURS:
+            stepX, stepY = x + dx, y + dy
+            if not gameMap.inBounds(stepX, stepY):
+                continue
+            if not walkable[stepX, stepY] or blocking[stepX, stepY]:
+                continue
+
+            stepDistance = self.distanceAt(stepX, stepY)
+            if stepDistance == UNREACHABLE:
+                continue
+
+            if (stepDistance < bestDistance) if downhill else (stepDistance > bestDistance):
+                best = stepX, stepY
+                bestDistance = stepDistance
+
+        return best
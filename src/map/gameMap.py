@@ -1,9 +1,21 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import itertools
+import os
+import weakref
 import numpy as np  # type: ignore
 from tcod.console import Console
+from tcod.map import compute_fov
 
+from src.engine.turnScheduler import TurnScheduler
 from src.map import tileTypes
+from src.map.activity import Activity
+from src.map.costGrid import CostGrid
+from src.map.perception import Perception
+from src.map.renderCache import RenderCache
+from src.map.renderOrder import RenderOrder
+from src.map.spatialIndex import SpatialIndex
+from src.entities.componentStore import NO_MAP, store
 from src.entities.entity import Actor, Item
 
 if TYPE_CHECKING:
@@ -11,62 +23,305 @@ if TYPE_CHECKING:
     from src.entities.entity import Entity
 
 
+# Source of the ids which tag the component store rows of each map's entities.
+_mapIds = itertools.count()
+
+
 class GameMap:
-    def __init__(self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()):
+    """
+    A map of tiles and the entities on it.
+
+    If 'storageDir' is given, the 'tiles', 'visible' and 'explored' layers are
+    memory mapped .npy files in that directory rather than in-memory arrays,
+    so only the parts of a large map which are in use get paged in. A new map
+    overwrites any files already there, unless 'reopen' is True, in which case
+    the existing files are mapped as they are, with no load step. GameMap.open
+    does this for a map stored earlier.
+    """
+
+    def __init__(
+            self,
+            engine: Engine,
+            width: int,
+            height: int,
+            entities: Iterable[Entity] = (),
+            storageDir: Optional[str] = None,
+            reopen: bool = False,
+    ):
         self.engine = engine
+        self.mapId = next(_mapIds)
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tileTypes.wall, order='F')
+        self.storageDir = storageDir
+        self._reopen = reopen
+        self.entities: Set[Entity] = set()
+        # The component store rows of this map's entities, by the order they're drawn in.
+        self.renderBuckets: Dict[RenderOrder, Set[int]] = {order: set() for order in RenderOrder}
+        # The area the last FOV could reach. Until there's been one, any tile could be visible.
+        self._fovWindow: Optional[Tuple[slice, slice]] = (slice(0, width), slice(0, height))
+        self._fovOrigin: Optional[Tuple[int, int, int]] = None  # The x, y and radius of the last FOV.
+        self._newLayers()
+        self.perception = Perception(self)
+        # When each actor other than the player next acts.
+        self.scheduler = TurnScheduler()
+        self.activity = Activity(self)
+
+        for entity in entities:
+            entity.parent = self
+            self.addEntity(entity)
+
+    @classmethod
+    def open(cls, engine: Engine, storageDir: str, entities: Iterable[Entity] = ()) -> GameMap:
+        """
+        Return the map whose layers were stored in 'storageDir' by an earlier
+        GameMap, mapping the files in place. Only the layers are stored there,
+        so its entities must be given, see saveGame.
+        """
+        path = os.path.join(storageDir, "tiles.npy")
+        width, height = np.lib.format.open_memmap(path, mode="r").shape
+        gameMap = cls(engine, width, height, entities, storageDir=storageDir, reopen=True)
+        gameMap.markTilesDirty()
+        return gameMap
+
+    def _newLayers(self) -> None:
+        """Allocate the per-tile arrays of this map."""
+        self.spatialIndex = SpatialIndex(self.width, self.height)
+        self.tiles = self._newLayer("tiles", tileTypes.wall)
+        self.costGrid = CostGrid(self)
 
         # Tiles currently in view.
-        self.visible = np.full(
-            (width, height), fill_value=False, order="F"
-        )
+        self.visible = self._newLayer("visible", np.bool_(False))
 
         # Tiles the player has seen before.
-        self.explored = np.full(
-            (width, height), fill_value=False, order="F"
+        self.explored = self._newLayer("explored", np.bool_(False))
+
+        self.renderCache = RenderCache(self)
+
+    def _newLayer(self, name: str, fill: np.ndarray) -> np.ndarray:
+        """
+        Return a map sized array filled with 'fill', memory mapped if this map has a storageDir.
+        When reopening, the existing file is returned as it is instead.
+        """
+        shape = self.width, self.height
+        if self.storageDir is None:
+            return np.full(shape, fill_value=fill, order="F")
+
+        path = os.path.join(self.storageDir, f"{name}.npy")
+        if self._reopen:
+            layer = np.lib.format.open_memmap(path, mode="r+")
+            if layer.shape != shape or layer.dtype != fill.dtype or not np.isfortran(layer):
+                raise ValueError(
+                    f"{path} doesn't hold a Fortran ordered {name} layer of shape {shape}."
+                )
+            return layer
+
+        layer = np.lib.format.open_memmap(
+            path, mode="w+", dtype=fill.dtype, shape=shape, fortran_order=True
         )
+        layer[...] = fill
+        return layer
+
+    def flush(self) -> None:
+        """Write any changes to memory mapped layers out to their files."""
+        for layer in (self.tiles, self.visible, self.explored):
+            if isinstance(layer, np.memmap):
+                layer.flush()
 
     @property
     def gameMap(self) -> GameMap:
         return self
 
+    @property
+    def cameraOrigin(self) -> Tuple[int, int]:
+        """The map position drawn at the top left corner of the console."""
+        return 0, 0
+
+    @property
+    def fovWindow(self) -> Optional[Tuple[slice, slice]]:
+        """The area the last FOV could reach, outside of which nothing is visible."""
+        return self._fovWindow
+
     @property
     def actors(self) -> Iterator[Actor]:
         """Iterate over this maps' living actors"""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.isAlive
-        )
+        yield from _owners(store.livingRowsOnMap(self.mapId))
+
+    def actorsWithin(self, x: int, y: int, radius: int) -> Iterator[Actor]:
+        """Iterate over the living actors within 'radius' tiles (Chebyshev distance) of x, y."""
+        rows = store.livingRowsOnMap(self.mapId)
+        near = (np.abs(store.x[rows] - x) <= radius) & (np.abs(store.y[rows] - y) <= radius)
+        yield from _owners(rows[near])
+
+    def actorsInFOV(self) -> Iterator[Actor]:
+        """Iterate over the living actors standing on visible tiles."""
+        rows = store.livingRowsOnMap(self.mapId)
+        yield from _owners(rows[self.visible[store.x[rows], store.y[rows]]])
 
     @property
     def items(self) -> Iterator[Item]:
         yield from (entity for entity in self.entities if isinstance(entity, Item))
 
+    def addEntity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location."""
+        if entity in self.entities:
+            return
+        self.entities.add(entity)
+        self.spatialIndex.add(entity)
+        self.renderBuckets[entity.renderOrder].add(entity._row)
+        store.mapId[entity._row] = self.mapId
+        store.owner[entity._row] = weakref.ref(entity)
+        if entity.blocksMovement:
+            self.costGrid.addBlocker(entity.x, entity.y)
+        self._schedule(entity)
+
+    def addEntities(self, entities: Iterable[Entity]) -> None:
+        """Add entities to this map at their current locations, in bulk."""
+        entities = [entity for entity in entities if entity not in self.entities]
+        if not entities:
+            return
+
+        rows = np.array([entity._row for entity in entities], dtype=np.intp)
+        xs, ys, blocks = store.x[rows], store.y[rows], store.blocks[rows]
+        owners = np.empty(len(entities), dtype=object)
+        owners[:] = [weakref.ref(entity) for entity in entities]
+
+        self.entities.update(entities)
+        self.spatialIndex.addMany(entities, xs, ys, blocks)
+        for entity in entities:
+            self.renderBuckets[entity.renderOrder].add(entity._row)
+        store.mapId[rows] = self.mapId
+        store.owner[rows] = owners
+        self.costGrid.addBlockers(xs[blocks], ys[blocks])
+        for entity in entities:
+            self._schedule(entity)
+
+    def removeEntity(self, entity: Entity) -> None:
+        """Remove an entity from this map."""
+        self.entities.remove(entity)
+        self.spatialIndex.remove(entity)
+        self.renderBuckets[entity.renderOrder].discard(entity._row)
+        store.mapId[entity._row] = NO_MAP
+        store.owner[entity._row] = None
+        if entity.blocksMovement:
+            self.costGrid.removeBlocker(entity.x, entity.y)
+        if isinstance(entity, Actor):
+            self.scheduler.remove(entity)
+            self.activity.remove(entity)
+
+    def _schedule(self, entity: Entity) -> None:
+        """Give a newly added actor its turns. The player's turns are driven by input instead."""
+        if isinstance(entity, Actor) and entity.isAlive and entity is not self.engine.player:
+            self.scheduler.schedule(entity)
+
+    def moveEntity(self, entity: Entity, oldX: int, oldY: int) -> None:
+        """Re-index an entity which has moved from oldX, oldY to its current location."""
+        self.spatialIndex.move(entity, oldX, oldY)
+        if entity.blocksMovement:
+            self.costGrid.removeBlocker(oldX, oldY)
+            self.costGrid.addBlocker(entity.x, entity.y)
+
+    def setBlocking(self, entity: Entity, blocksMovement: bool) -> None:
+        """Change whether an entity on this map blocks movement."""
+        if entity.blocksMovement != blocksMovement:
+            if blocksMovement:
+                self.costGrid.addBlocker(entity.x, entity.y)
+            else:
+                self.costGrid.removeBlocker(entity.x, entity.y)
+        self.spatialIndex.setBlocking(entity, blocksMovement)
+        entity.blocksMovement = blocksMovement
+
+    def setRenderOrder(self, entity: Entity, renderOrder: RenderOrder) -> None:
+        """Change the order an entity on this map is drawn in."""
+        self.renderBuckets[entity.renderOrder].discard(entity._row)
+        self.renderBuckets[renderOrder].add(entity._row)
+        entity.renderOrder = renderOrder
+
+    def markTilesDirty(self) -> None:
+        """Must be called after changing 'tiles' so that derived data is rebuilt."""
+        self.costGrid.markTerrainDirty()
+        self.perception.markTerrainDirty()
+        self._fovOrigin = None
+        self._markViewChanged(None)
+
+    def release(self) -> None:
+        """
+        Detach this map's entities from the component store, once the map
+        is no longer in use, so that it can be freed along with them.
+        """
+        rows = store.rowsOnMap(self.mapId)
+        store.mapId[rows] = NO_MAP
+        store.owner[rows] = None
+
+    def getEntitiesAtLocation(self, x: int, y: int) -> List[Entity]:
+        return self.spatialIndex.entitiesAt(x, y)
+
     def getBlockingEntityAtLocation(self, locationX: int, locationY: int) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                    entity.blocksMovement
-                    and entity.x == locationX
-                    and entity.y == locationY
-            ):
+        return self.spatialIndex.blockingEntityAt(locationX, locationY)
+
+    def getActorAtLocation(self, x: int, y: int) -> Optional[Actor]:
+        for entity in self.spatialIndex.entitiesAt(x, y):
+            if isinstance(entity, Actor) and entity.isAlive:
                 return entity
 
         return None
 
-    def getActorAtLocation(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+    def pathCost(self) -> np.ndarray:
+        """
+        Return the cost of moving onto each tile, for use by pathfinding.
+        Unwalkable tiles have a cost of zero, which marks them as impassable.
 
-        return None
+        The returned array is maintained in place by this map and must not be modified.
+        """
+        self.costGrid.refresh()
+        return self.costGrid.cost
 
     def inBounds(self, x: int, y: int) -> bool:
         """Return True if x and y are within the bounds of this map"""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def updateFOV(self, x: int, y: int, radius: int) -> None:
+        """
+        Recompute the visible area as seen from x, y.
+
+        Only the tiles within 'radius' are looked at and updated, so the cost
+        doesn't depend on the size of the map. Nothing is recomputed if the
+        viewpoint is unchanged and the tiles haven't been marked dirty since.
+        A radius of 0 or less means unlimited, covering the whole map.
+        """
+        if (x, y, radius) == self._fovOrigin:
+            return
+        self._fovOrigin = x, y, radius
+
+        if radius > 0:
+            left, top = max(0, x - radius), max(0, y - radius)
+            window = slice(left, x + radius + 1), slice(top, y + radius + 1)
+        else:
+            left, top = 0, 0
+            window = slice(0, self.width), slice(0, self.height)
+
+        if self._fovWindow:
+            self.visible[self._fovWindow] = False
+            self._markViewChanged(self._fovWindow)
+
+        visible = compute_fov(
+            self.tiles["transparent"][window],
+            (x - left, y - top),
+            radius=radius,
+            light_walls=True,
+        )
+        self.visible[window] = visible
+        # If a tile is "visible" it should be added to "explored".
+        self.explored[window] = self.explored[window] | visible
+
+        self._markViewChanged(window)
+        self._fovWindow = window
+
+    def _markViewChanged(self, window: Optional[Tuple[slice, slice]]) -> None:
+        """Redraw the tiles in 'window', or every tile if it's None."""
+        if window is None:
+            self.renderCache.markAllDirty()
+        else:
+            self.renderCache.markDirty(window)
+
     def render(self, console: Console) -> None:
         """
         Renders the map.
@@ -74,20 +329,37 @@ class GameMap:
         If a tile is in the "visible" array, draw it with "light" colours.
         If it isn't, but is in the "explored" array, draw it with "dark" colours.
         Else, default is "SHROUD". This draws tiles not in either array as black.
+        Tiles are drawn from 'renderCache', which only redraws what has changed.
         """
-        console.tiles_rgb[0: self.width, 0: self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tileTypes.SHROUD
-        )
+        console.tiles_rgb[0: self.width, 0: self.height] = self.renderCache.refresh()
+        self.renderEntities(console, 0, 0, self.width, self.height)
 
-        entitiesSortedForRender = sorted(
-            self.entities, key=lambda x: x.renderOrder.value
-        )
+    def renderEntities(self, console: Console, left: int, top: int, width: int, height: int) -> None:
+        """
+        Draw the entities on visible tiles within the 'width' by 'height' area
+        starting at 'left', 'top', which is drawn at the console's top left corner.
 
-        for entity in entitiesSortedForRender:
-            # Only print entities in FOV.
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.colour
-                )
+        Each render order bucket is drawn in one go, in order, so that actors
+        are drawn over items and items over corpses.
+        """
+        tiles = console.tiles_rgb
+        for order in RenderOrder:
+            bucket = self.renderBuckets[order]
+            if not bucket:
+                continue
+            rows = np.fromiter(bucket, dtype=np.intp, count=len(bucket))
+            xs, ys = store.x[rows], store.y[rows]
+
+            inView = (left <= xs) & (xs < left + width) & (top <= ys) & (ys < top + height)
+            rows, xs, ys = rows[inView], xs[inView], ys[inView]
+            shown = self.visible[xs, ys]  # Only draw entities in FOV.
+            rows, xs, ys = rows[shown], xs[shown] - left, ys[shown] - top
+
+            tiles["ch"][xs, ys] = store.ch[rows]
+            tiles["fg"][xs, ys] = store.fg[rows]
+
+
+def _owners(rows: np.ndarray) -> Iterator[Entity]:
+    """Yield the entities owning component store rows, which must be on a live map."""
+    for ref in store.owner[rows]:
+        yield ref()
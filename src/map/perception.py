@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+from tcod.map import compute_fov
+
+from src.entities.componentStore import store
+
+if TYPE_CHECKING:
+    from src.entities.entity import Actor
+    from src.map.gameMap import GameMap
+
+
+class Perception:
+    """
+    Which actors on a GameMap can see the player, worked out for all of them at once.
+
+    Line of sight is treated as symmetric, so rather than a FOV per actor
+    there's one reverse FOV from the player, reaching as far as the
+    longest sighted actor on the map can see. An actor sees the player if
+    it stands on a tile in that FOV within its own 'sight' radius.
+
+    The reverse FOV is kept until the player moves, the longest sight on
+    the map changes or the tiles are marked dirty. Which actors can see
+    is decided in one vectorised pass on the first query of each turn,
+    from where every actor stands at that point.
+    """
+
+    def __init__(self, gameMap: GameMap):
+        self.gameMap = gameMap
+        self._fov: Optional[np.ndarray] = None
+        self._fovOrigin: Tuple[int, int] = 0, 0  # Map position of the FOV's top left corner.
+        self._fovKey: Optional[Tuple[int, int, int]] = None  # The x, y and radius of the FOV.
+        self._seeing: Optional[Set[int]] = None  # Rows of the actors which can see the player.
+        # The longest sight of the actors on the map, as of the last time anyone looked for the player.
+        self.longestSight = 0
+
+    def newTurn(self) -> None:
+        """Decide again who can see the player on the next query, as actors may have moved."""
+        self._seeing = None
+
+    def markTerrainDirty(self) -> None:
+        """Must be called after the map's tiles change."""
+        self._fovKey = None
+        self._seeing = None
+
+    def canSeePlayer(self, actor: Actor) -> bool:
+        if self._seeing is None:
+            self._seeing = self._perceive(self.gameMap.engine.player)
+        return actor._row in self._seeing
+
+    def _perceive(self, target: Actor) -> Set[int]:
+        """Return the rows of the living actors on the map which can see 'target'."""
+        rows = store.livingRowsOnMap(self.gameMap.mapId)
+        rows = rows[rows != target._row]
+        sight = store.sight[rows]
+        radius = int(sight.max()) if len(rows) else 0
+        self.longestSight = radius
+        if radius <= 0:
+            # compute_fov treats a radius of 0 as unlimited, but nobody here can see at all.
+            return set()
+
+        x, y = target.x, target.y
+        if (x, y, radius) != self._fovKey:
+            left, top = max(0, x - radius), max(0, y - radius)
+            window = slice(left, x + radius + 1), slice(top, y + radius + 1)
+            self._fov = compute_fov(
+                self.gameMap.tiles["transparent"][window],
+                (x - left, y - top),
+                radius=radius,
+                light_walls=True,
+            )
+            self._fovOrigin = left, top
+            self._fovKey = x, y, radius
+
+        left, top = self._fovOrigin
+        width, height = self._fov.shape
+        xs, ys = store.x[rows] - left, store.y[rows] - top
+        inside = (0 <= xs) & (xs < width) & (0 <= ys) & (ys < height)
+        rows, xs, ys, sight = rows[inside], xs[inside], ys[inside], sight[inside]
+
+        # The FOV already stops at the longest sight, so only shorter sighted actors need a distance check.
+        dx, dy = store.x[rows] - x, store.y[rows] - y
+        inRange = (sight >= radius) | (dx * dx + dy * dy <= sight * sight)
+        return set(rows[self._fov[xs, ys] & inRange].tolist())
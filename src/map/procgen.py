@@ -1,84 +1,254 @@
 from __future__ import annotations
-import random
-import tcod
-from typing import Iterator, Tuple, List, TYPE_CHECKING
+import functools
+import numpy as np  # type: ignore
+from typing import Tuple, Optional, TYPE_CHECKING
+from src.map.chunkedMap import ChunkedGameMap
 from src.map.gameMap import GameMap
 from src.map import tileTypes
 from src.entities import entityFactories
+from src.entities.componentStore import store
 
 if TYPE_CHECKING:
     from src.engine.engine import Engine
 
 
-class RectangularRoom:
-    def __init__(self, x: int, y: int, width: int, height: int):
-        self.x1 = x
-        self.y1 = y
-        self.x2 = x + width
-        self.y2 = y + height
-
-    @property
-    def centre(self) -> Tuple[int, int]:
-        centreX = int((self.x1 + self.x2) / 2)
-        centreY = int((self.y1 + self.y2) / 2)
-
-        return centreX, centreY
-
-    @property
-    def inner(self) -> Tuple[slice, slice]:
-        """Return the inner area of this room as a 2D array index."""
-        return slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2)
-
-    def intersects(self, other: RectangularRoom) -> bool:
-        """Return True if this room overlaps with another RectangularRoom."""
-        return (
-                self.x1 <= other.x2
-                and self.x2 >= other.x1
-                and self.y1 <= other.y2
-                and self.y2 >= other.y1
-        )
+# Rooms are rows of x1, y1, x2, y2: the corners of their walls, inclusive.
+X1, Y1, X2, Y2 = range(4)
+
+
+def sampleRooms(
+        rng: np.random.Generator,
+        count: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        width: int,
+        height: int,
+) -> np.ndarray:
+    """Return 'count' random candidate rooms within a 'width' by 'height' area."""
+    roomWidths = rng.integers(minRoomSize, maxRoomSize, size=count, endpoint=True)
+    roomHeights = rng.integers(minRoomSize, maxRoomSize, size=count, endpoint=True)
+    xs = rng.integers(0, width - roomWidths - 1, endpoint=True)
+    ys = rng.integers(0, height - roomHeights - 1, endpoint=True)
+    return np.stack([xs, ys, xs + roomWidths, ys + roomHeights], axis=1)
+
+
+def selectRooms(candidates: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Return the candidate rooms which don't overlap an earlier accepted one, in order.
+
+    Each candidate is checked against a mask of the tiles claimed so far,
+    so a check costs the area of the room however many rooms there are.
+    """
+    claimed = np.zeros((width, height), dtype=bool, order="F")
+    keep = np.zeros(len(candidates), dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(candidates.tolist()):
+        window = claimed[x1: x2 + 1, y1: y2 + 1]
+        if not window.any():
+            window[...] = True
+            keep[i] = True
+    return candidates[keep]
+
+
+def roomCentres(rooms: np.ndarray) -> np.ndarray:
+    """Return the x, y centre of each room."""
+    return np.stack([(rooms[:, X1] + rooms[:, X2]) // 2, (rooms[:, Y1] + rooms[:, Y2]) // 2], axis=1)
+
+
+def tunnelTiles(
+        rng: np.random.Generator, starts: np.ndarray, ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the x and y coordinates of an L-shaped tunnel from each start to its end.
+    Each tunnel has an even chance of going horizontally or vertically first.
+    """
+    (x1, y1), (x2, y2) = starts.T, ends.T
+    horizontalFirst = rng.random(len(starts)) < 0.5
+    # The row of the horizontal leg and the column of the vertical leg.
+    rows = np.where(horizontalFirst, y1, y2)
+    columns = np.where(horizontalFirst, x2, x1)
+
+    horizontalXs, horizontalYs = _span(x1, x2), _repeatPerSpan(rows, x1, x2)
+    verticalYs, verticalXs = _span(y1, y2), _repeatPerSpan(columns, y1, y2)
+    return np.concatenate([horizontalXs, verticalXs]), np.concatenate([horizontalYs, verticalYs])
+
+
+def _span(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Return every integer from each start to its end inclusive, concatenated."""
+    lows = np.minimum(starts, ends)
+    lengths = np.abs(ends - starts) + 1
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(lows, lengths) + offsets
+
+
+def _repeatPerSpan(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    return np.repeat(values, np.abs(ends - starts) + 1)
+
+
+def carveLayout(
+        tiles: np.ndarray,
+        rng: np.random.Generator,
+        *,
+        maxRooms: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+) -> np.ndarray:
+    """
+    Dig rooms into 'tiles', each joined to the one before it by a tunnel,
+    and return the rooms in the order they were joined.
+
+    The floor is gathered into a mask first and written to 'tiles' in one go.
+    """
+    width, height = tiles.shape
+    candidates = sampleRooms(rng, maxRooms, minRoomSize, maxRoomSize, width, height)
+    rooms = selectRooms(candidates, width, height)
+
+    floor = np.zeros((width, height), dtype=bool, order="F")
+    for x1, y1, x2, y2 in rooms.tolist():
+        floor[x1 + 1: x2, y1 + 1: y2] = True
+    centres = roomCentres(rooms)
+    floor[tunnelTiles(rng, centres[:-1], centres[1:])] = True
+
+    setTiles(tiles, floor, tileTypes.floor)
+    return rooms
+
+
+def setTiles(tiles: np.ndarray, index, tile: np.ndarray) -> None:
+    """
+    Do 'tiles[index] = tile'.
+    Copying the tiles as raw bytes avoids converting the structured value for every tile.
+    """
+    raw = np.dtype((np.void, tiles.dtype.itemsize))
+    tiles.view(raw)[index] = np.asarray(tile, dtype=tiles.dtype).view(raw)
+
+
+# What rollSpawns can place, indexed by the "kind" of a spawn record.
+SPAWNABLE = (entityFactories.orc, entityFactories.troll, entityFactories.healthPotion)
+ORC, TROLL, HEALTH_POTION = range(len(SPAWNABLE))
+
+# Compact record of an entity to be spawned.
+SPAWN_DT = np.dtype([("kind", np.uint8), ("x", np.int32), ("y", np.int32)])
+
+
+def rollSpawns(
+        rooms: np.ndarray,
+        maxMonsters: int,
+        maximumItems: int,
+        rng: np.random.Generator,
+        taken: np.ndarray,
+) -> np.ndarray:
+    """
+    Return SPAWN_DT records for up to 'maxMonsters' monsters and 'maximumItems'
+    items in each room, monsters first.
+
+    Every spawn position is drawn at once. A position is given up if it's
+    already taken, either by one of the x, y pairs in 'taken' or by an
+    earlier spawn, which is checked against an occupancy mask of the rooms'
+    bounding area rather than entity by entity.
+    """
+    if not len(rooms):
+        return np.zeros(0, dtype=SPAWN_DT)
+    left, top = rooms[:, X1].min(), rooms[:, Y1].min()
+    width, height = rooms[:, X2].max() - left + 1, rooms[:, Y2].max() - top + 1
+
+    monsterRooms = np.repeat(np.arange(len(rooms)), rng.integers(0, maxMonsters, len(rooms), endpoint=True))
+    itemRooms = np.repeat(np.arange(len(rooms)), rng.integers(0, maximumItems, len(rooms), endpoint=True))
+    spawnRooms = rooms[np.concatenate([monsterRooms, itemRooms])]
+    xs = rng.integers(spawnRooms[:, X1] + 1, spawnRooms[:, X2])
+    ys = rng.integers(spawnRooms[:, Y1] + 1, spawnRooms[:, Y2])
+    kinds = np.full(len(spawnRooms), HEALTH_POTION, dtype=np.uint8)
+    kinds[: len(monsterRooms)] = np.where(rng.random(len(monsterRooms)) < 0.8, ORC, TROLL)
+
+    occupied = np.zeros((width, height), dtype=bool)
+    takenXs, takenYs = taken.reshape(-1, 2).T - np.array([[left], [top]])
+    inArea = (0 <= takenXs) & (takenXs < width) & (0 <= takenYs) & (takenYs < height)
+    occupied[takenXs[inArea], takenYs[inArea]] = True
+
+    # Keep the first spawn at each free position.
+    keys = (xs - left) * height + (ys - top)
+    first = np.zeros(len(keys), dtype=bool)
+    first[np.unique(keys, return_index=True)[1]] = True
+    keep = first & ~occupied[xs - left, ys - top]
+
+    records = np.zeros(np.count_nonzero(keep), dtype=SPAWN_DT)
+    records["kind"], records["x"], records["y"] = kinds[keep], xs[keep], ys[keep]
+    return records
+
+
+def spawnAll(dungeon: GameMap, records: np.ndarray) -> None:
+    """Spawn the entities described by SPAWN_DT 'records', a batch per kind."""
+    for kind, prototype in enumerate(SPAWNABLE):
+        ofKind = records[records["kind"] == kind]
+        prototype.spawnMany(dungeon, np.stack([ofKind["x"], ofKind["y"]], axis=1))
 
 
 def placeEntities(
-        room: RectangularRoom, dungeon: GameMap, maxMonsters: int, maximumItems: int
+        dungeon: GameMap,
+        rooms: np.ndarray,
+        maxMonsters: int,
+        maximumItems: int,
+        rng: np.random.Generator,
 ) -> None:
-    numberOfMonsters = random.randint(0, maxMonsters)
-    numberOfItems = random.randint(0, maximumItems)
+    """Spawn up to 'maxMonsters' monsters and 'maximumItems' items in each room, on free tiles."""
+    rows = store.rowsOnMap(dungeon.mapId)
+    taken = np.stack([store.x[rows], store.y[rows]], axis=1)
+    spawnAll(dungeon, rollSpawns(rooms, maxMonsters, maximumItems, rng, taken))
+
+
+class Level:
+    """
+    A generated dungeon level as plain arrays, with no entities or map yet.
+    Cheap to build in another process and send back, see buildLevel.
+    """
 
-    for i in range(numberOfMonsters):
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+    def __init__(self, tiles: np.ndarray, spawns: np.ndarray, playerStart: Optional[Tuple[int, int]]):
+        self.tiles = tiles
+        self.spawns = spawns  # SPAWN_DT records.
+        self.playerStart = playerStart
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            if random.random() < 0.8:
-                entityFactories.orc.spawn(dungeon, x, y)
-            else:
-                entityFactories.troll.spawn(dungeon,x, y)
 
-    for i in range(numberOfItems):
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+def generateLevel(
+        seed,
+        *,
+        mapWidth: int,
+        mapHeight: int,
+        maxRooms: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        maxMonstersPerRoom: int,
+        maxItemsPerRoom: int,
+) -> Level:
+    """
+    Generate the layout and spawns of a dungeon level.
+    The same 'seed', anything numpy.random.default_rng accepts, always gives the same level.
+    """
+    rng = np.random.default_rng(seed)
+    tiles = np.full((mapWidth, mapHeight), fill_value=tileTypes.wall, order="F")
+    rooms = carveLayout(
+        tiles, rng, maxRooms=maxRooms, minRoomSize=minRoomSize, maxRoomSize=maxRoomSize,
+    )
+
+    # The first room is where the player starts.
+    playerStart = tuple(roomCentres(rooms[:1])[0].tolist()) if len(rooms) else None
+    taken = np.array(playerStart if playerStart else (), dtype=np.int64)
+    spawns = rollSpawns(rooms, maxMonstersPerRoom, maxItemsPerRoom, rng, taken)
+    return Level(tiles, spawns, playerStart)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entityFactories.healthPotion.spawn(dungeon, x, y)
 
+def buildLevel(engine: Engine, level: Level, storageDir: Optional[str] = None) -> GameMap:
+    """
+    Return a new GameMap holding 'level', with the player placed at its start.
+    If 'storageDir' is given the map's tile layers are memory mapped files in it.
+    """
+    width, height = level.tiles.shape
+    player = engine.player
+    dungeon = GameMap(engine, width, height, storageDir=storageDir)
+    setTiles(dungeon.tiles, ..., level.tiles)
+    player.place(*(level.playerStart or (player.x, player.y)), dungeon)
+    spawnAll(dungeon, level.spawns)
 
-def tunnelBetween(start: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int, int]]:
-    """Return an L-shaped tunnel between these two points."""
-    x1, y1 = start
-    x2, y2 = end
-    if random.random() < 0.5:  # 50% chance
-        # Move Horizontal, then Vertical.
-        cornerX, cornerY = x2, y1
-    else:
-        # Move Vertically, then Horizontal.
-        cornerX, cornerY = x1, y2
+    dungeon.markTilesDirty()
 
-    # Generate the coordinates for this tunnel.
-    for x, y in tcod.los.bresenham((x1, y1), (cornerX, cornerY)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((cornerX, cornerY), (x2, y2)).tolist():
-        yield x, y
+    return dungeon
 
 
 def generateDungeon(
@@ -90,42 +260,148 @@ def generateDungeon(
         maxMonstersPerRoom: int,
         maxItemsPerRoom: int,
         engine: Engine,
+        storageDir: Optional[str] = None,
+        seed: Optional[int] = None,
 ) -> GameMap:
-    """Generate a new dungeon map."""
-    player = engine.player
-    dungeon = GameMap(engine, mapWidth, mapHeight, entities=[player])
+    """
+    Generate a new dungeon map.
+    If 'storageDir' is given the map's tile layers are memory mapped files in it.
+    The same 'seed' always gives the same dungeon, None picks one at random.
+    """
+    level = generateLevel(
+        seed,
+        mapWidth=mapWidth,
+        mapHeight=mapHeight,
+        maxRooms=maxRooms,
+        minRoomSize=minRoomSize,
+        maxRoomSize=maxRoomSize,
+        maxMonstersPerRoom=maxMonstersPerRoom,
+        maxItemsPerRoom=maxItemsPerRoom,
+    )
+    return buildLevel(engine, level, storageDir)
+
+
+def generateChunk(
+        dungeon: ChunkedGameMap,
+        chunkX: int,
+        chunkY: int,
+        *,
+        seed: int,
+        maxRooms: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        maxMonstersPerRoom: int,
+        maxItemsPerRoom: int,
+) -> None:
+    """
+    Generate one chunk of a ChunkedGameMap.
+
+    The rooms of a chunk are joined to each other, and the first room is
+    joined to the middle of each edge of the chunk which has a neighbour,
+    where the neighbour's tunnel meets it. The layout only depends on
+    'seed' and the chunk's position, so an evicted chunk comes back the
+    same. Entities are only placed the first time a chunk is generated.
+    """
+    rng = np.random.default_rng([seed, chunkX, chunkY])
+    size = dungeon.chunkSize
+    left, top = chunkX * size, chunkY * size
+
+    # Rooms are kept inside this chunk, laid out in chunk coordinates.
+    tiles = np.full((size, size), fill_value=tileTypes.wall, order="F")
+    rooms = carveLayout(
+        tiles, rng, maxRooms=maxRooms, minRoomSize=minRoomSize, maxRoomSize=maxRoomSize,
+    )
+
+    # Tunnel to the meeting points with each neighbouring chunk.
+    middle = size // 2
+    edges = []
+    if chunkY > 0:
+        edges.append((middle, 0))
+    if top + size < dungeon.height:
+        edges.append((middle, size - 1))
+    if chunkX > 0:
+        edges.append((0, middle))
+    if left + size < dungeon.width:
+        edges.append((size - 1, middle))
 
-    rooms: List[RectangularRoom] = []
+    if edges and len(rooms):
+        starts = np.repeat(roomCentres(rooms[:1]), len(edges), axis=0)
+        setTiles(tiles, tunnelTiles(rng, starts, np.array(edges)), tileTypes.floor)
 
-    for r in range(maxRooms):
-        roomWidth = random.randint(minRoomSize, maxRoomSize)
-        roomHeight = random.randint(minRoomSize, maxRoomSize)
+    dungeon.tiles[left: left + size, top: top + size] = tiles
 
-        x = random.randint(0, dungeon.width - roomWidth - 1)
-        y = random.randint(0, dungeon.height - roomHeight - 1)
+    if (chunkX, chunkY) not in dungeon.populatedChunks:
+        placeEntities(
+            dungeon, rooms + [left, top, left, top], maxMonstersPerRoom, maxItemsPerRoom, rng
+        )
 
-        # "RectangularRoom" class makes rectangles easier to work with
-        newRoom = RectangularRoom(x, y, roomWidth, roomHeight)
 
-        # Run through the other rooms and see if they intersect with this one.
-        if any(newRoom.intersects(otherRoom) for otherRoom in rooms):
-            continue  # This room intersects, so go to the next attempt.
-        # If there are no intersections then the room is valid.
+def generateChunkedWorld(
+        *,
+        seed: int,
+        chunkSize: int,
+        maxRoomsPerChunk: int,
+        minRoomSize: int,
+        maxRoomSize: int,
+        mapWidth: int,
+        mapHeight: int,
+        viewWidth: int,
+        viewHeight: int,
+        maxMonstersPerRoom: int,
+        maxItemsPerRoom: int,
+        engine: Engine,
+) -> ChunkedGameMap:
+    """
+    Return a new ChunkedGameMap, with the player placed in its central chunk,
+    or the nearest chunk to it with any free floor. Other chunks are
+    generated as they're needed.
+    """
+    if chunkSize <= maxRoomSize + 1:
+        raise ValueError(f"Chunk size {chunkSize} leaves no room for rooms of size {maxRoomSize} and their walls.")
 
-        # Dig out this rooms inner area.
-        dungeon.tiles[newRoom.inner] = tileTypes.floor
+    dungeon = ChunkedGameMap(
+        engine,
+        mapWidth,
+        mapHeight,
+        chunkSize=chunkSize,
+        generateChunk=functools.partial(
+            generateChunk,
+            seed=seed,
+            maxRooms=maxRoomsPerChunk,
+            minRoomSize=minRoomSize,
+            maxRoomSize=maxRoomSize,
+            maxMonstersPerRoom=maxMonstersPerRoom,
+            maxItemsPerRoom=maxItemsPerRoom,
+        ),
+        viewWidth=viewWidth,
+        viewHeight=viewHeight,
+    )
 
-        if len(rooms) == 0:
-            # The first room, where the player starts.
-            player.place(*newRoom.centre, dungeon)
-        else:  # All rooms after the first.
-            # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnelBetween(rooms[-1].centre, newRoom.centre):
-                dungeon.tiles[x, y] = tileTypes.floor
+    # Start on the free floor tile closest to the middle of the central chunk, looking
+    # in rings of chunks further and further out if it has none.
+    chunksX, chunksY = mapWidth // chunkSize, mapHeight // chunkSize
+    centreX, centreY = chunksX // 2, chunksY // 2
+    for ring in range(max(chunksX, chunksY)):
+        for chunkX in range(max(0, centreX - ring), min(chunksX, centreX + ring + 1)):
+            for chunkY in range(max(0, centreY - ring), min(chunksY, centreY + ring + 1)):
+                if max(abs(chunkX - centreX), abs(chunkY - centreY)) != ring:
+                    continue  # Already looked at in an earlier ring.
+                start = _freeTileNearMiddle(dungeon, chunkX, chunkY)
+                if start:
+                    engine.player.place(*start, dungeon)
+                    return dungeon
 
-        placeEntities(newRoom, dungeon, maxMonstersPerRoom, maxItemsPerRoom)
+    raise ValueError("The generated world has no free floor to start on.")
 
-        # Finally, append the new room to the list.
-        rooms.append(newRoom)
 
-    return dungeon
+def _freeTileNearMiddle(dungeon: ChunkedGameMap, chunkX: int, chunkY: int) -> Optional[Tuple[int, int]]:
+    """Return the free floor tile closest to the middle of a chunk, or None if it has none."""
+    size = dungeon.chunkSize
+    left, top = chunkX * size, chunkY * size
+    window = slice(left, left + size), slice(top, top + size)
+    free = dungeon.tiles["walkable"][window] & ~dungeon.spatialIndex.blocking[window].astype(bool)
+    xs, ys = np.nonzero(free)
+    if not len(xs):
+        return None
+    closest = np.argmin(np.abs(xs - size // 2) + np.abs(ys - size // 2))
+    return left + int(xs[closest]), top + int(ys[closest])
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import List, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from src.map import tileTypes
+
+if TYPE_CHECKING:
+    from src.map.gameMap import GameMap
+
+Window = Tuple[slice, slice]
+
+
+class RenderCache:
+    """
+    The tile layer of a GameMap as last drawn, kept between frames.
+
+    Each cell holds the "light" graphic of its tile if it's visible, the
+    "dark" graphic if it's only explored, and SHROUD otherwise. Only the
+    windows marked dirty since the last refresh are composited again, so
+    a frame where nothing changed costs no more than copying the buffer.
+    The map must mark the windows where 'tiles', 'visible' or 'explored'
+    change, which GameMap does in updateFOV and markTilesDirty.
+    """
+
+    def __init__(self, gameMap: GameMap):
+        self.gameMap = gameMap
+        self.buffer = np.zeros((gameMap.width, gameMap.height), dtype=tileTypes.graphicDt, order="F")
+        self._dirty: List[Window] = []
+        self._allDirty = True
+
+    def markDirty(self, window: Window) -> None:
+        """Composite the cells in 'window' again on the next refresh."""
+        if not self._allDirty:
+            self._dirty.append(window)
+
+    def markAllDirty(self) -> None:
+        """Composite every cell again on the next refresh."""
+        self._allDirty = True
+        self._dirty.clear()
+
+    def refresh(self) -> np.ndarray:
+        """Bring the buffer up to date and return it."""
+        if self._allDirty:
+            self._composite((slice(None), slice(None)))
+            self._allDirty = False
+        for window in self._dirty:
+            self._composite(window)
+        self._dirty.clear()
+        return self.buffer
+
+    def _composite(self, window: Window) -> None:
+        gameMap = self.gameMap
+        tiles = gameMap.tiles[window]
+        buffer = self.buffer[window]
+        buffer[...] = tileTypes.SHROUD
+        np.copyto(buffer, tiles["dark"], where=gameMap.explored[window])
+        np.copyto(buffer, tiles["light"], where=gameMap.visible[window])
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from src.entities.entity import Entity
+
+
+class SpatialIndex:
+    """
+    A per-tile index of the entities on a GameMap.
+
+    Entities are bucketed by the tile they were last indexed at, so location
+    lookups only need to look at the handful of entities on a single tile.
+    The index must be told whenever an entity is added, removed, moved or
+    stops blocking, which GameMap does on behalf of Entity and Fighter.
+    """
+
+    def __init__(self, width: int, height: int, blocking: Optional[np.ndarray] = None):
+        self.width, self.height = width, height
+        self._cells: Dict[Tuple[int, int], List[Entity]] = {}
+
+        # Number of movement blocking entities on each tile.
+        if blocking is None:
+            blocking = np.zeros((width, height), dtype=np.int16, order="F")
+        self.blocking = blocking
+
+    def add(self, entity: Entity) -> None:
+        self._cells.setdefault((entity.x, entity.y), []).append(entity)
+        if entity.blocksMovement:
+            self.blocking[entity.x, entity.y] += 1
+
+    def addMany(self, entities: List[Entity], xs: np.ndarray, ys: np.ndarray, blocks: np.ndarray) -> None:
+        """Add entities at once, given their positions and blocking flags as arrays."""
+        cells = self._cells
+        for entity, x, y in zip(entities, xs.tolist(), ys.tolist()):
+            cells.setdefault((x, y), []).append(entity)
+
+        if isinstance(self.blocking, np.ndarray):
+            np.add.at(self.blocking, (xs[blocks], ys[blocks]), 1)
+        else:
+            for x, y in zip(xs[blocks].tolist(), ys[blocks].tolist()):
+                self.blocking[x, y] += 1
+
+    def remove(self, entity: Entity) -> None:
+        self._discard(entity, entity.x, entity.y)
+        if entity.blocksMovement:
+            self.blocking[entity.x, entity.y] -= 1
+
+    def move(self, entity: Entity, oldX: int, oldY: int) -> None:
+        """Move an entity which has already changed its position from the old tile."""
+        self._discard(entity, oldX, oldY)
+        self._cells.setdefault((entity.x, entity.y), []).append(entity)
+        if entity.blocksMovement:
+            self.blocking[oldX, oldY] -= 1
+            self.blocking[entity.x, entity.y] += 1
+
+    def setBlocking(self, entity: Entity, blocksMovement: bool) -> None:
+        """Update the blocking counts for an indexed entity changing its blocksMovement flag."""
+        if entity.blocksMovement == blocksMovement:
+            return
+        self.blocking[entity.x, entity.y] += 1 if blocksMovement else -1
+
+    def entitiesAt(self, x: int, y: int) -> List[Entity]:
+        """Return the entities on a tile, in the order they arrived there."""
+        return self._cells.get((x, y), [])
+
+    def blockingEntityAt(self, x: int, y: int) -> Optional[Entity]:
+        """Return the first blocking entity on a tile, or None. Tiles off the map have none."""
+        if not (0 <= x < self.width and 0 <= y < self.height) or not self.blocking[x, y]:
+            return None
+
+        for entity in self._cells.get((x, y), ()):
+            if entity.blocksMovement:
+                return entity
+
+        return None
+
+    @property
+    def blockingMask(self) -> np.ndarray:
+        """Return a boolean array which is True where a tile holds a blocking entity."""
+        return self.blocking > 0
+
+    def _discard(self, entity: Entity, x: int, y: int) -> None:
+        cell = self._cells[x, y]
+        cell.remove(entity)
+        if not cell:
+            del self._cells[x, y]